@@ -0,0 +1,191 @@
+# array-backed core that steps B DeliveryFleetEnv instances in one NumPy call
+
+import numpy as np
+
+from env import STAY, RIGHT, PICKUP, DROPOFF
+from utils.collisions import resolve_moves
+from utils.grid_map import as_grid_map, open_grid_moves
+from utils.seeding import BlockSampler
+
+# Order slot states (order id == slot index, like DeliveryFleetEnv)
+NO_ORDER, WAITING, PICKED, DELIVERED = -1, 0, 1, 2
+
+PICKUP_REWARD = 5
+DROPOFF_REWARD = 20
+
+# Per-action (dx, dy); PICKUP/DROPOFF/STAY don't move
+_MOVE_DX = np.array([0, 0, 0, -1, 1, 0, 0], dtype=np.int16)
+_MOVE_DY = np.array([0, -1, 1, 0, 0, 0, 0], dtype=np.int16)
+
+
+class BatchedDeliveryCore:
+    """
+    Holds B delivery environments as struct-of-arrays and applies moves,
+    pickups, dropoffs and spawns for the whole batch at once.
+
+    State (x, y convention of DeliveryFleetEnv):
+      positions      int16[B, A, 2]
+      carrying       int32[B, A]      order id or -1
+      order_pickup   int16[B, M, 2]
+      order_dropoff  int16[B, M, 2]
+      order_status   int8[B, M]       NO_ORDER / WAITING / PICKED / DELIVERED
+      num_orders     int32[B]         orders spawned so far (next order id)
+
+    Given the same reset seed and the same actions (and the same `grid_map`), every
+    env in the batch produces the same transitions as DeliveryFleetEnv.
+    """
+
+    def __init__(self, num_envs, grid_size=8, num_agents=3, max_orders=6, order_spawn_rate=3, max_steps=200,
+                 grid_map=None, collisions=False, collision_penalty=0.5):
+        self.grid_map = as_grid_map(grid_map) if grid_map is not None else None
+        if self.grid_map is not None:
+            grid_size = self.grid_map.grid_size
+        self.valid_moves = self.grid_map.valid_moves if self.grid_map is not None else open_grid_moves(grid_size)
+        # agents, pickups, dropoffs, [walls]
+        self.num_channels = 3 + (self.grid_map is not None)
+        self.num_envs = num_envs
+        self.grid_size = grid_size
+        self.num_agents = num_agents
+        self.max_orders = max_orders
+        self.order_spawn_rate = order_spawn_rate
+        self.max_steps = max_steps
+        # same collision mode as DeliveryFleetEnv; `blocked` holds the agents blocked on the last step
+        self.collisions = collisions
+        self.collision_penalty = collision_penalty
+
+        B, A, M = num_envs, num_agents, max_orders
+        self.t = np.zeros(B, dtype=np.int32)
+        self.positions = np.zeros((B, A, 2), dtype=np.int16)
+        self.carrying = np.full((B, A), -1, dtype=np.int32)
+        self.order_pickup = np.zeros((B, M, 2), dtype=np.int16)
+        self.order_dropoff = np.zeros((B, M, 2), dtype=np.int16)
+        self.order_status = np.full((B, M), NO_ORDER, dtype=np.int8)
+        self.num_orders = np.zeros(B, dtype=np.int32)
+        self.blocked = np.zeros((B, A), dtype=bool)
+
+        # one cell stream per env, drawn like DeliveryFleetEnv's so seeded episodes match
+        n_cells = len(self.grid_map.free_cells) if self.grid_map is not None else grid_size * grid_size
+        self._cells = [BlockSampler(n_cells) for _ in range(B)]
+        # Strictly-lower-triangular masks used to rank agents / orders sharing a cell
+        self._agent_before = np.tri(A, A, -1, dtype=bool)
+        self._order_before = np.tri(M, M, -1, dtype=bool)
+
+    def reset(self, env_ids=None, seeds=None):
+        """Reset the given envs (all by default); `seeds` is one seed (or None) per env."""
+        env_ids = np.arange(self.num_envs) if env_ids is None else np.asarray(env_ids)
+        seeds = [None] * len(env_ids) if seeds is None else seeds
+        for b, seed in zip(env_ids, seeds):
+            if seed is not None:
+                self._cells[b].reseed(np.random.default_rng(seed))
+            cells = self._cells[b]
+            taken = set()
+            for a in range(self.num_agents):
+                cell = tuple(self._random_cell(cells))
+                while self.collisions and cell in taken:
+                    cell = tuple(self._random_cell(cells))
+                taken.add(cell)
+                self.positions[b, a] = cell
+        self.t[env_ids] = 0
+        self.carrying[env_ids] = -1
+        self.order_status[env_ids] = NO_ORDER
+        self.num_orders[env_ids] = 0
+
+    def step(self, actions):
+        """
+        `actions` is int[B, A]. Returns (rewards float32[B, A], delivered bool[B, A], truncated bool[B]).
+        """
+        actions = np.asarray(actions)
+        B, A = self.num_envs, self.num_agents
+        self.t += 1
+
+        # ----- Spawn new orders -----
+        spawning = (self.num_orders < self.max_orders) & (self.t % self.order_spawn_rate == 0)
+        for b in np.flatnonzero(spawning):
+            slot = self.num_orders[b]
+            cells = self._cells[b]
+            self.order_pickup[b, slot] = self._random_cell(cells)
+            self.order_dropoff[b, slot] = self._random_cell(cells)
+            self.order_status[b, slot] = WAITING
+            self.num_orders[b] += 1
+
+        rewards = np.zeros((B, A), dtype=np.float32)
+        pos = self.positions
+
+        # ----- Pickups -----
+        # Agents act in index order, so the k-th agent asking at a cell gets the k-th waiting order there.
+        wants = (actions == PICKUP) & (self.carrying < 0)
+        if wants.any():
+            waiting = self.order_status == WAITING
+            same_cell_agents = (pos[:, :, None, :] == pos[:, None, :, :]).all(-1) & wants[:, None, :]
+            agent_rank = (same_cell_agents & self._agent_before).sum(-1)
+            pk = self.order_pickup
+            same_cell_orders = (pk[:, :, None, :] == pk[:, None, :, :]).all(-1) & waiting[:, None, :]
+            order_rank = (same_cell_orders & self._order_before).sum(-1)
+            match = (
+                (pos[:, :, None, :] == pk[:, None, :, :]).all(-1)
+                & waiting[:, None, :]
+                & wants[:, :, None]
+                & (agent_rank[:, :, None] == order_rank[:, None, :])
+            )
+            b_idx, a_idx, o_idx = np.nonzero(match)
+            self.order_status[b_idx, o_idx] = PICKED
+            self.carrying[b_idx, a_idx] = o_idx
+            rewards[b_idx, a_idx] += PICKUP_REWARD
+
+        # ----- Dropoffs -----
+        delivered = (actions == DROPOFF) & (self.carrying >= 0)
+        if delivered.any():
+            carried = np.maximum(self.carrying, 0)
+            target = np.take_along_axis(self.order_dropoff, carried[:, :, None], axis=1)
+            delivered &= (pos == target).all(-1)
+            b_idx, a_idx = np.nonzero(delivered)
+            self.order_status[b_idx, self.carrying[b_idx, a_idx]] = DELIVERED
+            self.carrying[b_idx, a_idx] = -1
+            rewards[b_idx, a_idx] += DROPOFF_REWARD
+
+        # ----- Moves (blocked by the border, walls and one-way streets) -----
+        move = np.where(actions <= RIGHT, actions, STAY)
+        allowed = self.valid_moves[pos[..., 1], pos[..., 0], move]
+        if self.collisions:
+            # resolve all envs in one call: cell ids are offset per env so envs never interact
+            G = self.grid_size
+            offset = (np.arange(B, dtype=np.int64) * G * G)[:, None]
+            cur = offset + pos[..., 1].astype(np.int64) * G + pos[..., 0]
+            prop = cur + (_MOVE_DY[move] * G + _MOVE_DX[move]) * allowed
+            final, blocked = resolve_moves(cur.ravel(), prop.ravel())
+            cell = final.reshape(B, A) - offset
+            pos[..., 1], pos[..., 0] = np.divmod(cell, G)
+            self.blocked = blocked.reshape(B, A)
+            rewards -= self.collision_penalty * self.blocked
+        else:
+            pos[..., 0] += _MOVE_DX[move] * allowed
+            pos[..., 1] += _MOVE_DY[move] * allowed
+
+        truncated = self.t >= self.max_steps
+        return rewards, delivered, truncated
+
+    def observe(self, out=None):
+        """Paint the (C, G, G) grid observation of every env into float32[B, C, G, G] (C = num_channels)."""
+        B, G = self.num_envs, self.grid_size
+        if out is None:
+            out = np.zeros((B, self.num_channels, G, G), dtype=np.float32)
+        else:
+            out[:, :3] = 0
+        if self.grid_map is not None:
+            out[:, 3] = self.grid_map.static_layer
+
+        b_idx = np.repeat(np.arange(B), self.num_agents)
+        out[b_idx, 0, self.positions[..., 1].ravel(), self.positions[..., 0].ravel()] = 1.0
+
+        b_idx, o_idx = np.nonzero(self.order_status == WAITING)
+        out[b_idx, 1, self.order_pickup[b_idx, o_idx, 1], self.order_pickup[b_idx, o_idx, 0]] = 1.0
+        b_idx, o_idx = np.nonzero(self.order_status == PICKED)
+        out[b_idx, 2, self.order_dropoff[b_idx, o_idx, 1], self.order_dropoff[b_idx, o_idx, 0]] = 1.0
+        return out
+
+    def _random_cell(self, cells):
+        k = cells.draw()
+        if self.grid_map is not None:
+            return self.grid_map.free_cells[k]
+        y, x = divmod(k, self.grid_size)
+        return (x, y)
@@ -0,0 +1,185 @@
+import os
+import glob
+import time
+import argparse
+import numpy as np
+from env import DeliveryFleetEnv, PICKUP, DROPOFF
+from policies.coordinated_greedy import CoordinatedGreedy
+from policies.heuristics_greedy_approach import self_policy
+from utils.navigation import navigator_for
+
+# Headless benchmark: every policy plays the same seeded episodes, `--batch-envs` envs in
+# lockstep so model inference is one batched forward pass per step. No rendering, no sleeps.
+#
+# Policy specs (repeat --policy):
+#   random | greedy | self                       heuristics (greedy/self take --nav)
+#   ppo:<zip or dir>                             single-agent PPO on agent_0, other agents random
+#                                                (as in SingleAgentWrapper); a dir means every .zip in it
+#   shared:<zip>                                 parameter-sharing PPO acting for every agent
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark policies over many seeded headless episodes")
+    parser.add_argument("--policy", action="append", default=None,
+                        help="random, greedy, self, ppo:<path> or shared:<path> (repeatable)")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--batch-envs", type=int, default=64, help="envs stepped in lockstep")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grid-size", type=int, default=8)
+    parser.add_argument("--num-agents", type=int, default=3)
+    parser.add_argument("--max-orders", type=int, default=6)
+    parser.add_argument("--order-spawn-rate", type=int, default=3)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--obs-mode", choices=("grid", "egocentric", "entities"), default="grid")
+    parser.add_argument("--view-size", type=int, default=11)
+    parser.add_argument("--nav", action="store_true", help="heuristics move along shortest paths")
+    parser.add_argument("--pickup-actions", action="store_true",
+                        help="greedy acts PICKUP/DROPOFF on arrival instead of its default STAY")
+    parser.add_argument("--step-seconds", type=float, default=60.0,
+                        help="simulated time per env step, for the orders/hour figure")
+    parser.add_argument("--deterministic", action="store_true", help="argmax actions for PPO policies")
+    return parser.parse_args()
+
+# ----- batched policies: act(envs, rng) -> int[B, A] actions -----
+class RandomPolicy:
+    def act(self, envs, rng):
+        return rng.integers(0, 7, size=(len(envs), len(envs[0].possible_agents)))
+
+class GreedyBatch:
+    """CoordinatedGreedy.act_arrays over the whole batch (orders padded to the batch maximum)."""
+
+    def __init__(self, envs, nav=False, pickup_actions=False):
+        self.policy = CoordinatedGreedy(envs[0], nav=navigator_for(envs[0]) if nav else None)
+        if pickup_actions:
+            self.policy.pickup_action, self.policy.dropoff_action = PICKUP, DROPOFF
+
+    def act(self, envs, rng):
+        agents = envs[0].possible_agents
+        B, M = len(envs), max(1, max(len(env.orders) for env in envs))
+        pickups = np.zeros((B, M, 2), dtype=np.int32)
+        dropoffs = np.zeros((B, M, 2), dtype=np.int32)
+        active = np.zeros((B, M), dtype=bool)
+        for b, env in enumerate(envs):
+            for m, order in enumerate(env.orders):
+                pickups[b, m], dropoffs[b, m], active[b, m] = order["pickup"], order["dropoff"], True
+        positions = np.array([[env.agent_positions[a] for a in agents] for env in envs], dtype=np.int32)
+        # same carrying test as CoordinatedGreedy.act
+        carrying = np.array([[bool(env.agent_carrying[a]) for a in agents] for env in envs])
+        return self.policy.act_arrays(positions, carrying, pickups, dropoffs, active)
+
+class SelfPolicy:
+    def __init__(self, envs, nav=False):
+        self.nav = navigator_for(envs[0]) if nav else None
+
+    def act(self, envs, rng):
+        # the random fallback draws from the run's seeded rng, so --seed replays it
+        return np.array([[self_policy(env, a, nav=self.nav, rng=rng) for a in env.possible_agents] for env in envs])
+
+class PPOBatch:
+    """One predict() per step: agent_0's obs of every env (single) or every agent's (shared)."""
+
+    def __init__(self, model, shared, deterministic=False):
+        self.model, self.shared, self.deterministic = model, shared, deterministic
+
+    def act(self, envs, rng):
+        A = len(envs[0].possible_agents)
+        joint = np.stack([env.joint_observation() for env in envs])      # [B, A, *obs]
+        if self.shared:
+            actions, _ = self.model.predict(joint.reshape(len(envs) * A, -1), deterministic=self.deterministic)
+            return actions.reshape(len(envs), A)
+        actions = rng.integers(0, 7, size=(len(envs), A))
+        actions[:, 0], _ = self.model.predict(joint[:, 0].reshape(len(envs), -1), deterministic=self.deterministic)
+        return actions
+
+def expand_specs(specs):
+    """ppo:<dir> -> one ppo:<zip> spec per checkpoint in the directory."""
+    out = []
+    for spec in specs:
+        kind, _, path = spec.partition(":")
+        if kind == "ppo" and os.path.isdir(path):
+            out += [f"ppo:{p}" for p in sorted(glob.glob(os.path.join(path, "*.zip")))]
+        else:
+            out.append(spec)
+    return out
+
+def make_policy(spec, envs, args):
+    kind, _, path = spec.partition(":")
+    if kind == "random":
+        return RandomPolicy()
+    if kind == "greedy":
+        return GreedyBatch(envs, nav=args.nav, pickup_actions=args.pickup_actions)
+    if kind == "self":
+        return SelfPolicy(envs, nav=args.nav)
+    if kind in ("ppo", "shared"):
+        from stable_baselines3 import PPO
+        model = PPO.load(path, device="cpu")
+        expected = int(np.prod(model.observation_space.shape))
+        got = int(np.prod(envs[0].joint_observation().shape[1:]))
+        if expected != got:
+            raise ValueError(f"{path} expects {expected} obs features, the benchmark env gives {got} "
+                             f"(match --grid-size / --obs-mode / --view-size to the training run)")
+        return PPOBatch(model, shared=kind == "shared", deterministic=args.deterministic)
+    raise ValueError(f"Unknown policy spec {spec!r}")
+
+def run(spec, args, env_kwargs):
+    envs = [DeliveryFleetEnv(**env_kwargs) for _ in range(min(args.batch_envs, args.episodes))]
+    policy = make_policy(spec, envs, args)
+    rng = np.random.default_rng(args.seed)
+    rewards, delivered, spawned = [], [], []
+    steps = 0
+    start = time.perf_counter()
+    for first in range(0, args.episodes, len(envs)):
+        batch = envs[:min(len(envs), args.episodes - first)]
+        for b, env in enumerate(batch):
+            env.reset(seed=args.seed + first + b)
+        if isinstance(policy, GreedyBatch):
+            # fresh sweep state per batch of episodes
+            policy.policy.path_idx = np.zeros((len(batch), batch[0].num_agents), dtype=np.int64)
+        ep_reward = np.zeros(len(batch))
+        running = np.ones(len(batch), dtype=bool)
+        while running.any():
+            live = [env for env, r in zip(batch, running) if r]
+            actions = policy.act(live, rng)
+            for i, env, act in zip(np.flatnonzero(running), live, actions):
+                _, rew, terminations, truncations, _ = env.step(dict(zip(env.possible_agents, act.tolist())))
+                ep_reward[i] += sum(rew.values())
+                running[i] = not all(terminations[a] or truncations[a] for a in env.possible_agents)
+            steps += len(live)
+        rewards += ep_reward.tolist()
+        delivered += [len(env.order_history) for env in batch]
+        spawned += [env.next_order_id for env in batch]
+    elapsed = time.perf_counter() - start
+
+    sim_hours = steps * args.step_seconds / 3600
+    return dict(
+        episodes=len(rewards),
+        reward=float(np.mean(rewards)),
+        reward_std=float(np.std(rewards)),
+        delivered=float(np.mean(delivered)),
+        rate=sum(delivered) / max(sum(spawned), 1),
+        orders_per_hour=sum(delivered) / sim_hours,
+        steps_per_sec=steps / elapsed,
+    )
+
+def main():
+    args = parse_args()
+    env_kwargs = dict(
+        grid_size=args.grid_size,
+        num_agents=args.num_agents,
+        max_orders=args.max_orders,
+        order_spawn_rate=args.order_spawn_rate,
+        max_steps=args.max_steps,
+        obs_mode=args.obs_mode,
+        view_size=args.view_size,
+    )
+    specs = expand_specs(args.policy or ["random", "greedy", "self"])
+
+    print(f"{'policy':<40} {'episodes':>8} {'reward/ep':>15} {'delivered/ep':>12} {'rate':>7} "
+          f"{'orders/hour':>11} {'steps/s':>9}")
+    for spec in specs:
+        res = run(spec, args, env_kwargs)
+        print(f"{spec:<40} {res['episodes']:>8} {res['reward']:>7.2f} ± {res['reward_std']:<5.2f} "
+              f"{res['delivered']:>12.2f} {res['rate']:>7.1%} {res['orders_per_hour']:>11.2f} "
+              f"{res['steps_per_sec']:>9,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import itertools
+import subprocess
+import tempfile
+import numpy as np
+from env import DeliveryFleetEnv
+from wrapper.single_agent import SingleAgentWrapper
+from wrapper.multi_agent import MultiAgentWrapper
+from policies.coordinated_greedy import CoordinatedGreedy
+from policies.heuristics_greedy_approach import self_policy
+from utils.replay_buffer import PerAgentReplayBuffer
+
+# Reproducible simulator benchmarks with JSON output, to diff performance between commits:
+#   python src/benchmark_suite.py --out bench/HEAD.json
+#   python src/benchmark_suite.py --out bench/new.json --compare bench/HEAD.json
+# Every timing is the median of --repeats runs; seeds, versions and hardware go into "meta".
+
+BENCHMARKS = ("env", "wrappers", "policies", "replay", "ppo")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro/macro benchmarks of the delivery simulator")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="small config grid and step counts (smoke run)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=2000, help="env steps per timing run")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--num-agents", type=int, nargs="+", default=[3, 8, 32])
+    parser.add_argument("--max-orders", type=int, nargs="+", default=[6, 50])
+    parser.add_argument("--order-spawn-rates", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--ppo-envs", type=int, default=4, help="DummyVecEnv size for the PPO collection run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout only)")
+    parser.add_argument("--compare", default=None, help="earlier JSON report to print ratios against")
+    args = parser.parse_args()
+    if args.quick:
+        args.steps, args.repeats = 500, 1
+        args.grid_sizes, args.num_agents = args.grid_sizes[:1], args.num_agents[:2]
+        args.max_orders, args.order_spawn_rates = args.max_orders[:1], args.order_spawn_rates[-1:]
+    return args
+
+# ----- helpers -----
+def median_time(fn, repeats):
+    """Median wall time of `fn()` over `repeats` runs (fn does its own setup outside the timed region)."""
+    times = []
+    for _ in range(repeats):
+        times.append(fn())
+    return float(np.median(times))
+
+def random_actions(rng, steps, agents):
+    return [{a: rng.randrange(7) for a in agents} for _ in range(steps)]
+
+def config_name(cfg):
+    return f"g{cfg['grid_size']}_a{cfg['num_agents']}_o{cfg['max_orders']}_r{cfg['order_spawn_rate']}"
+
+def hardware():
+    info = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+    }
+    try:
+        with open("/proc/cpuinfo") as f:
+            info["cpu_model"] = next(l.split(":", 1)[1].strip() for l in f if l.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    try:
+        info["memory_gb"] = round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30, 1)
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        import torch
+        import stable_baselines3
+        info.update(torch=torch.__version__, torch_threads=torch.get_num_threads(),
+                    sb3=stable_baselines3.__version__,
+                    cuda=torch.cuda.get_device_name(0) if torch.cuda.is_available() else None)
+    except ImportError:
+        pass
+    return info
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, timeout=10, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "") if out.returncode == 0 else None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+# ----- benchmarks: each returns {name: {metric: value}} -----
+def bench_env(args):
+    results = {}
+    grid = itertools.product(args.grid_sizes, args.num_agents, args.max_orders, args.order_spawn_rates)
+    for grid_size, num_agents, max_orders, spawn_rate in grid:
+        if num_agents > grid_size * grid_size:
+            continue
+        cfg = dict(grid_size=grid_size, num_agents=num_agents, max_orders=max_orders, order_spawn_rate=spawn_rate)
+        env = DeliveryFleetEnv(**cfg)
+        actions = random_actions(random.Random(args.seed), args.steps, env.possible_agents)
+
+        def run_steps():
+            env.reset(seed=args.seed)
+            start = time.perf_counter()
+            for k, a in enumerate(actions):
+                env.step(a)
+                if env.t >= env.max_steps:
+                    env.reset(seed=args.seed + k)
+            return time.perf_counter() - start
+
+        def run_resets(n=200):
+            start = time.perf_counter()
+            for k in range(n):
+                env.reset(seed=args.seed + k)
+            return (time.perf_counter() - start) / n
+
+        step_s = median_time(run_steps, args.repeats)
+        results[f"env/{config_name(cfg)}"] = {
+            "steps_per_sec": args.steps / step_s,
+            "agent_steps_per_sec": args.steps * num_agents / step_s,
+            "reset_us": 1e6 * median_time(run_resets, args.repeats),
+        }
+    return results
+
+def bench_wrappers(args):
+    cfg = dict(grid_size=8, num_agents=3, max_orders=6, order_spawn_rate=3)
+    rng = np.random.default_rng(args.seed)
+    acts = rng.integers(0, 7, size=(args.steps, cfg["num_agents"]))
+
+    def timed_loop(reset, step, acts_list):
+        def run():
+            reset()
+            start = time.perf_counter()
+            for a in acts_list:
+                if step(a):
+                    reset()
+            return time.perf_counter() - start
+        return median_time(run, args.repeats) / len(acts_list)
+
+    env = DeliveryFleetEnv(**cfg)
+    raw_actions = [dict(zip(env.possible_agents, row.tolist())) for row in acts]
+
+    def env_step(a):
+        env.step(a)
+        return env.t >= env.max_steps
+
+    env_s = timed_loop(lambda: env.reset(seed=args.seed), env_step, raw_actions)
+
+    single = SingleAgentWrapper(DeliveryFleetEnv, env_kwargs=cfg, max_episode_steps=200)
+    single.action_space.seed(args.seed)
+    single_s = timed_loop(lambda: single.reset(seed=args.seed), lambda a: any(single.step(a)[2:4]),
+                          acts[:, 0].tolist())
+
+    multi = MultiAgentWrapper(DeliveryFleetEnv, env_kwargs=cfg)
+    multi_s = timed_loop(lambda: multi.reset(seed=args.seed), lambda a: any(multi.step(a)[2:4]), list(acts))
+
+    return {
+        "wrappers/env": {"step_us": 1e6 * env_s},
+        "wrappers/single_agent": {"step_us": 1e6 * single_s, "overhead_us": 1e6 * (single_s - env_s)},
+        "wrappers/multi_agent": {"step_us": 1e6 * multi_s, "overhead_us": 1e6 * (multi_s - env_s)},
+    }
+
+def bench_policies(args):
+    results = {}
+    for num_agents in (3, 16):
+        env = DeliveryFleetEnv(grid_size=16, num_agents=num_agents, max_orders=50, order_spawn_rate=1)
+        obs, _ = env.reset(seed=args.seed)
+        random.seed(args.seed)
+        greedy = CoordinatedGreedy(env, seed=args.seed)
+        greedy_us, self_us = [], []
+        for _ in range(args.steps // 4):
+            start = time.perf_counter()
+            actions = greedy.act(obs)
+            greedy_us.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for agent in env.agents:
+                self_policy(env, agent)
+            self_us.append((time.perf_counter() - start) / num_agents)
+            obs, *_ = env.step(actions)
+            if env.t >= env.max_steps:
+                obs, _ = env.reset(seed=args.seed + env.t)
+        for name, samples in (("coordinated_greedy_act", greedy_us), ("self_policy", self_us)):
+            samples = 1e6 * np.asarray(samples)
+            results[f"policies/{name}_a{num_agents}"] = {
+                "mean_us": float(samples.mean()),
+                "p50_us": float(np.percentile(samples, 50)),
+                "p99_us": float(np.percentile(samples, 99)),
+            }
+    return results
+
+def bench_replay(args):
+    env = DeliveryFleetEnv(grid_size=8, num_agents=3, max_orders=6, order_spawn_rate=3)
+    rng = random.Random(args.seed)
+    transitions = []
+    obs, _ = env.reset(seed=args.seed)
+    obs = {a: o.copy() for a, o in obs.items()}
+    for _ in range(args.steps):
+        actions = {a: rng.randrange(7) for a in env.agents}
+        next_obs, rewards, terminations, truncations, _ = env.step(actions)
+        next_obs = {a: o.copy() for a, o in next_obs.items()}
+        dones = {a: terminations[a] or truncations[a] for a in env.agents}
+        transitions.append((obs, actions, rewards, next_obs, dones))
+        obs = next_obs
+        if all(dones.values()):
+            obs, _ = env.reset()
+            obs = {a: o.copy() for a, o in obs.items()}
+
+    rb = None
+
+    def fill():
+        nonlocal rb
+        rb = PerAgentReplayBuffer(capacity=args.steps, seed=args.seed)
+        start = time.perf_counter()
+        for t in transitions:
+            rb.add_step(*t)
+        return time.perf_counter() - start
+
+    add_s = median_time(fill, args.repeats)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.npz")
+
+        def save():
+            start = time.perf_counter()
+            rb.save_npz(path)
+            return time.perf_counter() - start
+
+        save_s = median_time(save, args.repeats)
+        size_mb = os.path.getsize(path) / 2**20
+    return {"replay/per_agent_buffer": {
+        "add_step_us": 1e6 * add_s / len(transitions),
+        "save_npz_s": save_s,
+        "save_npz_mb": size_mb,
+        "transitions": len(transitions) * env.num_agents,
+    }}
+
+def bench_ppo(args):
+    import torch
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.callbacks import BaseCallback
+    from stable_baselines3.common.utils import set_random_seed
+    from utils.vec_envs import make_vec_env
+
+    def make_env():
+        return SingleAgentWrapper(DeliveryFleetEnv, env_kwargs=dict(grid_size=8, num_agents=3, max_orders=5,
+                                                                   order_spawn_rate=3))
+
+    class PhaseTimes(BaseCallback):
+        """Wall time of every rollout and of every update that follows one."""
+
+        def __init__(self):
+            super().__init__()
+            self.rollout, self.train = [], []
+            self._start = self._rollout_end = None
+
+        def _on_rollout_start(self):
+            self._start = time.perf_counter()
+            if self._rollout_end is not None:
+                self.train.append(self._start - self._rollout_end)
+
+        def _on_step(self) -> bool:
+            return True
+
+        def _on_rollout_end(self):
+            self._rollout_end = time.perf_counter()
+            self.rollout.append(self._rollout_end - self._start)
+
+        def _on_training_end(self):
+            self.train.append(time.perf_counter() - self._rollout_end)
+
+    set_random_seed(args.seed)
+    venv = make_vec_env(make_env, args.ppo_envs, "dummy", seed=args.seed)
+    n_steps = max(64, (args.steps // args.ppo_envs) // 2)
+    model = PPO("MlpPolicy", venv, n_steps=n_steps, seed=args.seed, device="cpu")
+    # one rollout + update per repeat, through the public learn() loop
+    phases = PhaseTimes()
+    model.learn(total_timesteps=n_steps * args.ppo_envs * args.repeats, callback=phases, reset_num_timesteps=True)
+    collect_s = float(np.median(phases.rollout))
+    train_s = float(np.median(phases.train))
+    venv.close()
+    return {
+        "ppo/collect_rollouts": {
+            "samples_per_sec": n_steps * args.ppo_envs / collect_s,
+            "num_envs": args.ppo_envs,
+            "n_steps": n_steps,
+            "torch_threads": torch.get_num_threads(),
+        },
+        "ppo/train": {
+            "samples_per_sec": n_steps * args.ppo_envs / train_s,
+            "n_epochs": model.n_epochs,
+            "batch_size": model.batch_size,
+        },
+    }
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nvs {baseline_path} (ratio = new / old)")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if isinstance(old, (int, float)) and old and isinstance(value, float):
+                print(f"  {name:<40} {metric:<20} {old:>12.2f} -> {value:>12.2f}  x{value / old:.2f}")
+
+def main():
+    args = parse_args()
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "seed": args.seed,
+        "repeats": args.repeats,
+        "steps": args.steps,
+        "argv": sys.argv[1:],
+        "hardware": hardware(),
+    }
+    runners = dict(env=bench_env, wrappers=bench_wrappers, policies=bench_policies, replay=bench_replay, ppo=bench_ppo)
+    results = {}
+    for name in args.only:
+        start = time.perf_counter()
+        part = runners[name](args)
+        for key, metrics in part.items():
+            print(f"{key:<40} " + ", ".join(f"{m}={v:,.2f}" if isinstance(v, float) else f"{m}={v}"
+                                            for m, v in metrics.items()))
+        print(f"[{name}] {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        results.update(part)
+
+    report = {"meta": meta, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import time
+
+import numpy as np
+
+from env import DeliveryFleetEnv
+from policies.assignment import AssignmentPolicy
+from policies.coordinated_greedy import CoordinatedGreedy
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the assignment policy with the coordinated greedy baseline")
+    parser.add_argument("--episodes", type=int, default=5)
+    parser.add_argument("--steps-per-ep", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grid-size", type=int, default=8)
+    parser.add_argument("--num-agents", type=int, default=3)
+    parser.add_argument("--max-orders", type=int, default=50)
+    parser.add_argument("--order-spawn-rate", type=int, default=2)
+    return parser.parse_args()
+
+def run(make_policy, env_kwargs, episodes, steps_per_ep, seed):
+    env = DeliveryFleetEnv(**env_kwargs)
+    reward_sum = spawned = delivered = 0
+    act_times, solve_times = [], []
+    for ep in range(episodes):
+        obs, _ = env.reset(seed=seed + ep)
+        policy = make_policy(env)
+        for t in range(steps_per_ep):
+            start = time.perf_counter()
+            actions = policy.act(obs)
+            act_times.append(time.perf_counter() - start)
+            obs, rewards, terminations, truncations, _ = env.step(actions)
+            reward_sum += sum(rewards.values())
+            if all(terminations[a] or truncations[a] for a in env.agents):
+                break
+        solve_times += getattr(policy, "solve_times", [])
+        spawned += env.next_order_id
+        delivered += len(env.order_history)
+    return dict(
+        reward=reward_sum / episodes,
+        delivered=delivered,
+        rate=delivered / spawned if spawned else 0.0,
+        act_ms=1e3 * np.mean(act_times),
+        solve_ms=1e3 * np.mean(solve_times) if solve_times else float("nan"),
+        solve_max_ms=1e3 * np.max(solve_times) if solve_times else float("nan"),
+    )
+
+def main():
+    args = parse_args()
+    env_kwargs = dict(
+        grid_size=args.grid_size,
+        num_agents=args.num_agents,
+        max_orders=args.max_orders,
+        order_spawn_rate=args.order_spawn_rate,
+        max_steps=args.steps_per_ep,
+    )
+    policies = {
+        "greedy": lambda env: CoordinatedGreedy(env, seed=args.seed),
+        "assignment": lambda env: AssignmentPolicy(env),
+        # keeps still-valid pairs and only matches the rest: faster, not minimum-cost
+        "assignment (warm, approx)": lambda env: AssignmentPolicy(env, warm_start=True),
+    }
+    for name, make_policy in policies.items():
+        res = run(make_policy, env_kwargs, args.episodes, args.steps_per_ep, args.seed)
+        print(
+            f"{name:>25}: reward/ep={res['reward']:.1f}, delivered={res['delivered']} ({res['rate']:.1%}), "
+            f"act={res['act_ms']:.3f} ms/step, solver={res['solve_ms']:.3f} ms/step (max {res['solve_max_ms']:.3f})"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# convert a legacy replay .npz (agent_i/obs, agent_i/actions, ...) into the chunked memory-mapped format
+import argparse
+import numpy as np
+from utils.replay_dataset import convert_npz
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("src", nargs="?", default="data/replay_greedy_coordinated.npz")
+    parser.add_argument("dst", nargs="?", default="data/replay_greedy_coordinated")
+    parser.add_argument("--chunk-size", type=int, default=65_536)
+    parser.add_argument("--obs-dtype", default=None, help="e.g. uint8; default keeps the stored dtype")
+    args = parser.parse_args()
+
+    ds = convert_npz(args.src, args.dst, chunk_size=args.chunk_size,
+                     obs_dtype=np.dtype(args.obs_dtype) if args.obs_dtype else None)
+    print(f"Converted {args.src} -> {args.dst} ({len(ds)} transitions, agents: {ds.agents})")
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,412 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import random
+from collections import deque
 from gymnasium import spaces
+from numpy.lib.stride_tricks import sliding_window_view
 from pettingzoo.utils import ParallelEnv
 
+from utils.collisions import resolve_moves
+from utils.grid_map import as_grid_map, open_grid_moves
+from utils.obs_encoding import OBS_DTYPES, obs_space as binary_obs_space, pack_obs
+from utils.profiling import timed
+from utils.seeding import BlockSampler
+
 # Actions
 STAY, UP, DOWN, LEFT, RIGHT, PICKUP, DROPOFF = range(7)
+MOVES = {UP: (0, -1), DOWN: (0, 1), LEFT: (-1, 0), RIGHT: (1, 0)}
+
+
+class OrderHistory:
+    """
+    Compact store for delivered orders, one int32 row per order:
+      (id, pickup_x, pickup_y, dropoff_x, dropoff_y, t_spawn, t_pickup, t_delivered)
+    """
+
+    COLUMNS = ("id", "pickup_x", "pickup_y", "dropoff_x", "dropoff_y", "t_spawn", "t_pickup", "t_delivered")
+
+    def __init__(self, capacity=64):
+        self._rows = np.zeros((capacity, len(self.COLUMNS)), dtype=np.int32)
+        self._n = 0
+
+    def append(self, order, t_delivered):
+        if self._n == len(self._rows):
+            self._rows = np.concatenate([self._rows, np.zeros_like(self._rows)])
+        self._rows[self._n] = (
+            order["id"], *order["pickup"], *order["dropoff"],
+            order["t_spawn"], order["t_pickup"], t_delivered,
+        )
+        self._n += 1
+
+    def clear(self):
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def as_array(self):
+        return self._rows[:self._n]
 
 
 class DeliveryFleetEnv(ParallelEnv):
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, grid_size=8, num_agents=3, max_orders=6, order_spawn_rate=3, max_steps=200):
+    def __init__(self, grid_size=8, num_agents=3, max_orders=6, order_spawn_rate=3, max_steps=200, self_channel=False,
+                 grid_map=None, collisions=False, collision_penalty=0.5,
+                 obs_mode="grid", view_size=11, max_entities=8, obs_dtype="float32"):
         super().__init__()
+        # Optional static layout (GridMap, occupancy array, networkx graph or ASCII map); it sets the grid size
+        self.grid_map = as_grid_map(grid_map) if grid_map is not None else None
+        if self.grid_map is not None:
+            grid_size = self.grid_map.grid_size
+        self.valid_moves = self.grid_map.valid_moves if self.grid_map is not None else open_grid_moves(grid_size)
         self.grid_size = grid_size
         self._num_agents = num_agents
         self.max_orders = max_orders
         self.order_spawn_rate = order_spawn_rate
         self.max_steps = max_steps
+        self.self_channel = self_channel
+        # Collision mode: agents start on distinct cells and all moves happen at once,
+        # vertex/swap conflicts are resolved jointly and blocked agents pay `collision_penalty`
+        self.collisions = collisions
+        self.collision_penalty = collision_penalty
+        n_cells = len(self.grid_map.free_cells) if self.grid_map is not None else grid_size * grid_size
+        if collisions and num_agents > n_cells:
+            raise ValueError(f"collisions=True needs a free cell per agent ({num_agents} agents, {n_cells} cells)")
 
         self.agents = [f"agent_{i}" for i in range(num_agents)]
         self.possible_agents = self.agents[:]
 
+        # Observation modes:
+        #   "grid"        full (C, G, G) grid, channels agents, pickups, dropoffs, [self], [walls]
+        #   "egocentric"  (4, K, K) crop centred on the agent (K = view_size), channels agents,
+        #                 pickups, dropoffs, walls (cells off the map count as walls)
+        #   "entities"    (2 + 2 * max_entities, 3) rows of (present, dx, dy), offsets divided by G:
+        #                 own absolute position, own carried order's dropoff, nearest other agents,
+        #                 nearest waiting pickups (both nearest first, zero rows when absent)
+        if obs_mode not in ("grid", "egocentric", "entities"):
+            raise ValueError(f"Unknown obs_mode {obs_mode!r}")
+        if self_channel and obs_mode != "grid":
+            raise ValueError("self_channel is only available with obs_mode='grid'")
+        # Binary grid/crop observations can also be produced as uint8 or bit-packed uint8 bytes
+        # (np.packbits of the flattened obs); cast them to float at the policy input
+        # (utils.feature_extractors.BinaryObsExtractor).
+        if obs_dtype not in OBS_DTYPES:
+            raise ValueError(f"Unknown obs_dtype {obs_dtype!r} (expected one of {OBS_DTYPES})")
+        if obs_dtype != "float32" and obs_mode == "entities":
+            raise ValueError("obs_mode='entities' holds signed offsets and needs obs_dtype='float32'")
+        self.obs_dtype = obs_dtype
+        self.obs_mode = obs_mode
+        self.view_size = view_size
+        self.max_entities = max_entities
+
         # Action and observation spaces
         self.action_spaces = {agent: spaces.Discrete(7) for agent in self.agents}
-        self.observation_spaces = {
-            agent: spaces.Box(low=0, high=1, shape=(3, grid_size, grid_size), dtype=np.float32)
-            for agent in self.agents
-        }
+        self._n_dynamic = 4 if self_channel else 3
+        n_channels = self._n_dynamic + (self.grid_map is not None or obs_mode == "egocentric")
+        if obs_mode == "entities":
+            self.obs_shape = (2 + 2 * max_entities, 3)
+            obs_space = spaces.Box(low=-1, high=1, shape=self.obs_shape, dtype=np.float32)
+        else:
+            if obs_mode == "egocentric" and view_size % 2 == 0:
+                raise ValueError(f"view_size must be odd, got {view_size}")
+            side = grid_size if obs_mode == "grid" else view_size
+            self.obs_shape = (n_channels, side, side)
+            obs_space = binary_obs_space(self.obs_shape, obs_dtype)
+        self.observation_spaces = {agent: obs_space for agent in self.agents}
+        buf_dtype = np.float32 if obs_dtype == "float32" else np.uint8
+
+        # Persistent observation tensor, updated cell by cell as the state changes.
+        # Without a self channel every agent shares one grid; with it, each agent owns a
+        # slice whose shared channels are kept in sync by broadcast writes.
+        # The egocentric mode pads it by K // 2 so every crop is a window of the same tensor.
+        n_slices = num_agents if self_channel else 1
+        self._pad = view_size // 2 if obs_mode == "egocentric" else 0
+        P = grid_size + 2 * self._pad
+        self._obs_buf = np.zeros((n_slices, n_channels, P, P), dtype=buf_dtype)
+        self._cell_counts = np.zeros((3, grid_size, grid_size), dtype=np.int32)
+        if n_channels > self._n_dynamic:
+            # written once here; resets and steps only touch the dynamic channels
+            self._obs_buf[:, -1] = 1.0
+            inner = self._obs_buf[:, -1, self._pad:self._pad + grid_size, self._pad:self._pad + grid_size]
+            inner[...] = self.grid_map.static_layer if self.grid_map is not None else 0.0
+
+        if obs_mode == "egocentric":
+            # windows[y, x] is the (C, K, K) crop centred on cell (x, y), a view of _obs_buf
+            self._windows = sliding_window_view(self._obs_buf[0], (view_size, view_size), axis=(1, 2))
+            self._windows = self._windows.transpose(1, 2, 0, 3, 4)
+            self._agent_obs = np.zeros((num_agents, *self.obs_shape), dtype=buf_dtype)
+        elif obs_mode == "entities":
+            self._agent_obs = np.zeros((num_agents, *self.obs_shape), dtype=np.float32)
+        if obs_dtype == "packed":
+            n_packed = n_slices if obs_mode == "grid" else num_agents
+            self._packed_obs = np.zeros((n_packed, *obs_space.shape), dtype=np.uint8)
+        self._obs_views = {}
+        for i, agent in enumerate(self.agents):
+            if obs_dtype == "packed":
+                view = self._packed_obs[i if self_channel or obs_mode != "grid" else 0]
+            elif obs_mode == "grid":
+                view = self._obs_buf[i if self_channel else 0]
+            else:
+                view = self._agent_obs[i]
+            view = view.view()
+            view.flags.writeable = False
+            self._obs_views[agent] = view
+        # Every agent's observation as one (A, *obs) array, still a view of the same tensors
+        # (agents sharing one grid slice get a zero-stride broadcast of it)
+        joint = self._packed_obs if obs_dtype == "packed" else self._obs_buf if obs_mode == "grid" else self._agent_obs
+        if len(joint) == 1:
+            self._joint_obs = np.broadcast_to(joint[0], (num_agents, *joint.shape[1:]))
+        else:
+            self._joint_obs = joint.view()
+            self._joint_obs.flags.writeable = False
+        self._agent_idx = {agent: i for i, agent in enumerate(self.agents)}
 
         # State
         self.t = 0
         self.agent_positions = {}
         self.agent_carrying = {}
-        self.orders = []
+        # Spawn cells come from the env's own Generator, pre-drawn in blocks (unseeded: OS entropy)
+        self._cells = BlockSampler(n_cells)
+
+        # Orders: active ones by id, delivered ones in a compact history.
+        # Waiting order ids are indexed by pickup cell (oldest first) so PICKUP/DROPOFF are O(1).
+        self.next_order_id = 0
+        self.active_orders = {}
+        self.order_history = OrderHistory()
+        self._waiting_by_cell = {}
 
+    @timed("env.reset")
     def reset(self, seed=None, options=None):
+        # A seeded reset restarts the env's stream; unseeded resets continue it
+        if seed is not None:
+            self._cells.reseed(np.random.default_rng(seed))
         self.t = 0
         self.agents = self.possible_agents[:]
-        self.agent_positions = {agent: self._random_empty_cell() for agent in self.agents}
+        self.agent_positions = {}
+        taken = set()
+        for agent in self.agents:
+            cell = self._random_empty_cell()
+            while self.collisions and cell in taken:
+                cell = self._random_empty_cell()
+            taken.add(cell)
+            self.agent_positions[agent] = cell
         self.agent_carrying = {agent: None for agent in self.agents}
-        self.orders = []
-        obs = {agent: self._get_obs(agent) for agent in self.agents}
+        self.next_order_id = 0
+        self.active_orders = {}
+        self.order_history.clear()
+        self._waiting_by_cell = {}
+
+        self._obs_buf[:, :self._n_dynamic] = 0.0
+        self._cell_counts[:] = 0
+        for agent, pos in self.agent_positions.items():
+            self._mark(0, pos, +1)
+            self._mark_self(agent, pos, 1.0)
+
+        obs = self._observe()
         infos = {agent: {} for agent in self.agents}
         return obs, infos
 
+    @timed("env.step")
     def step(self, actions):
         self.t += 1
         rewards = {agent: 0 for agent in self.agents}
         terminations = {agent: False for agent in self.agents}
         truncations = {agent: False for agent in self.agents}
         infos = {agent: {"delivered": False} for agent in self.agents}
+        if self.collisions:
+            for info in infos.values():
+                info["blocked"] = False
+        proposed = {}
 
         # Spawn new orders
-        if len(self.orders) < self.max_orders and self.t % self.order_spawn_rate == 0:
-            self.orders.append(self._generate_order())
+        if self.next_order_id < self.max_orders and self.t % self.order_spawn_rate == 0:
+            self._spawn_order()
 
         # Apply actions
-        for agent, action in actions.items():
-            x, y = self.agent_positions[agent]
+        self._apply_actions(actions, rewards, infos, proposed)
 
-            if action == UP:
-                y = max(0, y - 1)
-            elif action == DOWN:
-                y = min(self.grid_size - 1, y + 1)
-            elif action == LEFT:
-                x = max(0, x - 1)
-            elif action == RIGHT:
-                x = min(self.grid_size - 1, x + 1)
-            elif action == PICKUP and self.agent_carrying[agent] is None:
-                for order in self.orders:
-                    if order["status"] == "waiting" and (x, y) == order["pickup"]:
-                        order["status"] = "picked"
-                        self.agent_carrying[agent] = order["id"]
-                        rewards[agent] += 5
-                        break
-            elif action == DROPOFF and self.agent_carrying[agent] is not None:
-                for order in self.orders:
-                    if order["id"] == self.agent_carrying[agent] and (x, y) == order["dropoff"]:
-                        order["status"] = "delivered"
-                        self.agent_carrying[agent] = None
-                        rewards[agent] += 20
-                        infos[agent]["delivered"] = True
-                        break
-
-            self.agent_positions[agent] = (x, y)
+        if proposed:
+            self._resolve_collisions(proposed, rewards, infos)
 
         # End condition
         done = self.t >= self.max_steps
         if done:
             truncations = {agent: True for agent in self.agents}
 
-        obs = {agent: self._get_obs(agent) for agent in self.agents}
+        obs = self._observe()
         return obs, rewards, terminations, truncations, infos
 
+    @timed("env.spawn")
+    def _spawn_order(self):
+        order = self._generate_order()
+        self.next_order_id += 1
+        self.active_orders[order["id"]] = order
+        self._waiting_by_cell.setdefault(order["pickup"], deque()).append(order["id"])
+        self._mark(1, order["pickup"], +1)
+
+    @timed("env.actions")
+    def _apply_actions(self, actions, rewards, infos, proposed):
+        """Moves, pickups and dropoffs in agent order; with collisions, moves are only proposed."""
+        for agent, action in actions.items():
+            x, y = self.agent_positions[agent]
+
+            if action in MOVES:
+                # blocked by the border, a wall or a one-way street: stay put
+                if self.valid_moves[y, x, action]:
+                    dx, dy = MOVES[action]
+                    if self.collisions:
+                        proposed[agent] = (x + dx, y + dy)
+                    else:
+                        x, y = x + dx, y + dy
+            elif action == PICKUP and self.agent_carrying[agent] is None:
+                waiting = self._waiting_by_cell.get((x, y))
+                if waiting:
+                    order = self.active_orders[waiting.popleft()]
+                    if not waiting:
+                        del self._waiting_by_cell[(x, y)]
+                    order["status"] = "picked"
+                    order["t_pickup"] = self.t
+                    self._mark(1, order["pickup"], -1)
+                    self._mark(2, order["dropoff"], +1)
+                    self.agent_carrying[agent] = order["id"]
+                    rewards[agent] += 5
+            elif action == DROPOFF and self.agent_carrying[agent] is not None:
+                order = self.active_orders[self.agent_carrying[agent]]
+                if (x, y) == order["dropoff"]:
+                    order["status"] = "delivered"
+                    del self.active_orders[order["id"]]
+                    self.order_history.append(order, self.t)
+                    self._mark(2, order["dropoff"], -1)
+                    self.agent_carrying[agent] = None
+                    rewards[agent] += 20
+                    infos[agent]["delivered"] = True
+
+            self._move_agent(agent, (x, y))
+
+    @timed("env.obs")
+    def _observe(self):
+        self._refresh_obs()
+        return {agent: self._get_obs(agent) for agent in self.agents}
+
+    def _move_agent(self, agent, cell):
+        old = self.agent_positions[agent]
+        if cell != old:
+            self._mark(0, old, -1)
+            self._mark(0, cell, +1)
+            self._mark_self(agent, old, 0.0)
+            self._mark_self(agent, cell, 1.0)
+        self.agent_positions[agent] = cell
+
+    @timed("env.collisions")
+    def _resolve_collisions(self, proposed, rewards, infos):
+        G = self.grid_size
+        cur = np.array([y * G + x for x, y in self.agent_positions.values()], dtype=np.int64)
+        prop = cur.copy()
+        for agent, (x, y) in proposed.items():
+            prop[self._agent_idx[agent]] = y * G + x
+        final, blocked = resolve_moves(cur, prop)
+        for i in np.flatnonzero(final != cur):
+            y, x = divmod(int(final[i]), G)
+            self._move_agent(self.agents[i], (x, y))
+        for i in np.flatnonzero(blocked):
+            agent = self.agents[i]
+            rewards[agent] -= self.collision_penalty
+            infos[agent]["blocked"] = True
+
     def _random_empty_cell(self):
-        return (random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1))
+        k = self._cells.draw()
+        if self.grid_map is not None:
+            x, y = self.grid_map.free_cells[k]
+            return (int(x), int(y))
+        y, x = divmod(k, self.grid_size)
+        return (x, y)
+
+    @property
+    def orders(self):
+        """Active (waiting or picked) orders in id order; delivered ones live in `order_history`."""
+        return list(self.active_orders.values())
 
     def _generate_order(self):
         return {
-            "id": len(self.orders),
+            "id": self.next_order_id,
             "pickup": self._random_empty_cell(),
             "dropoff": self._random_empty_cell(),
             "status": "waiting",
+            "t_spawn": self.t,
+            "t_pickup": -1,
         }
 
-    def _get_obs(self, agent):
-        grid = np.zeros((3, self.grid_size, self.grid_size), dtype=np.float32)
+    def _mark(self, channel, cell, delta):
+        # Cells can hold several agents/orders, so the obs bit tracks a per-cell count
+        x, y = cell
+        self._cell_counts[channel, y, x] += delta
+        self._obs_buf[:, channel, y + self._pad, x + self._pad] = float(self._cell_counts[channel, y, x] > 0)
 
-        # Agents
-        for pos in self.agent_positions.values():
-            grid[0, pos[1], pos[0]] = 1.0
+    def _mark_self(self, agent, cell, value):
+        if self.self_channel:
+            x, y = cell
+            self._obs_buf[self._agent_idx[agent], 3, y, x] = value
 
-        # Orders
-        for order in self.orders:
-            if order["status"] == "waiting":
-                px, py = order["pickup"]
-                grid[1, py, px] = 1.0
-            elif order["status"] == "picked":
-                dx, dy = order["dropoff"]
-                grid[2, dy, dx] = 1.0
+    def _refresh_obs(self):
+        # The grid mode is kept up to date by _mark; the other modes are gathered for all agents at once
+        if self.obs_mode == "egocentric":
+            pos = np.array(list(self.agent_positions.values()), dtype=np.int64)
+            self._agent_obs[...] = self._windows[pos[:, 1], pos[:, 0]]
+        elif self.obs_mode == "entities":
+            self._gather_entities()
+        if self.obs_dtype == "packed":
+            self._packed_obs[...] = pack_obs(self._obs_buf if self.obs_mode == "grid" else self._agent_obs)
+
+    def _gather_entities(self):
+        pos = np.array(list(self.agent_positions.values()), dtype=np.int64)
+        G, N = self.grid_size, self.max_entities
+        out = self._agent_obs
+        out[...] = 0.0
+        out[:, 0] = np.column_stack([np.ones(len(pos)), pos / G])
+        for i, oid in enumerate(self.agent_carrying.values()):
+            if oid is not None:
+                out[i, 1] = (1.0, *((np.array(self.active_orders[oid]["dropoff"]) - pos[i]) / G))
 
-        return grid
+        pickups = np.array(
+            [o["pickup"] for o in self.active_orders.values() if o["status"] == "waiting"], dtype=np.int64
+        ).reshape(-1, 2)
+        for row, targets, exclude_self in ((2, pos, True), (2 + N, pickups, False)):
+            dist = (np.abs(pos[:, None, 0] - targets[None, :, 0]) + np.abs(pos[:, None, 1] - targets[None, :, 1])).astype(np.float64)
+            if exclude_self:
+                np.fill_diagonal(dist, np.inf)
+            k = min(N, targets.shape[0] - exclude_self)
+            if k <= 0:
+                continue
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k] if k < dist.shape[1] else np.arange(k)[None].repeat(len(pos), 0)
+            nearest = np.take_along_axis(nearest, np.take_along_axis(dist, nearest, 1).argsort(1, kind="stable"), 1)
+            out[:, row:row + k, 0] = 1.0
+            out[:, row:row + k, 1:] = (targets[nearest] - pos[:, None, :]) / G
+
+    def joint_observation(self):
+        """Read-only (num_agents, *obs_shape) view of all observations; valid until the next step/reset."""
+        return self._joint_obs
+
+    def _get_obs(self, agent):
+        # Read-only view into the persistent tensor: valid until the next step/reset, copy to keep it
+        return self._obs_views[agent]
 
     def render(self, mode="human"):
         grid = np.zeros((self.grid_size, self.grid_size, 3), dtype=np.uint8) + 255  # white background
 
+        if self.grid_map is not None:
+            grid[self.grid_map.static_layer > 0] = [40, 40, 40]  # dark walls
+
         # Orders
-        for order in self.orders:
+        for row in self.order_history.as_array():
+            x, y = row[3], row[4]
+            grid[y, x] = [180, 180, 180]  # gray delivered
+        for order in self.active_orders.values():
             if order["status"] == "waiting":
                 x, y = order["pickup"]
                 grid[y, x] = [255, 0, 0]  # red pickup
             elif order["status"] == "picked":
                 x, y = order["dropoff"]
                 grid[y, x] = [0, 0, 255]  # blue dropoff
-            elif order["status"] == "delivered":
-                x, y = order["dropoff"]
-                grid[y, x] = [180, 180, 180]  # gray delivered
 
         # Agents
         for _, pos in self.agent_positions.items():
@@ -2,28 +2,49 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+import sys
+from utils.replay_dataset import ReplayDataset
 
-def main():
-    path = "data/replay_greedy_coordinated.npz"
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Replay buffer not found: {path}")
+def load_columns(path):
+    """Per-agent (n_transitions, obs_shape, actions, rewards, dones) from a chunked dataset or a legacy .npz."""
+    if os.path.isdir(path):
+        # chunked dataset: only the small columns are read, obs stay on disk
+        ds = ReplayDataset(path)
+        print(f"✅ Opened replay dataset {path} ({len(ds)} transitions)")
+        out = {}
+        for agent in ds.agents:
+            cols = {name: np.concatenate([ds.column(agent, c, name) for c in range(ds.num_chunks(agent))])
+                    for name in ("actions", "rewards", "dones")}
+            n = ds.num_transitions(agent)
+            out[agent] = (n, (n, *ds.obs_shape), cols["actions"], cols["rewards"], cols["dones"])
+        return out
 
     data = np.load(path, allow_pickle=True)
     print(f"✅ Loaded replay buffer from {path}")
     print("Available keys:", list(data.keys()))
+    out = {}
+    for agent in sorted(set(k.split("/")[0] for k in data.keys())):
+        obs = data[f"{agent}/obs"]
+        out[agent] = (len(obs), obs.shape, data[f"{agent}/actions"], data[f"{agent}/rewards"], data[f"{agent}/dones"])
+    return out
 
-    agents = sorted(set(k.split("/")[0] for k in data.keys()))
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/replay_greedy_coordinated"
+    if not os.path.exists(path) and os.path.exists(path + ".npz"):
+        path += ".npz"
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Replay buffer not found: {path}")
+
+    columns = load_columns(path)
+    agents = list(columns)
     print("\n🤖 Agents found:", agents)
 
     for agent in agents:
-        obs = data[f"{agent}/obs"]
-        actions = data[f"{agent}/actions"]
-        rewards = data[f"{agent}/rewards"]
-        dones = data[f"{agent}/dones"]
+        n, obs_shape, actions, rewards, dones = columns[agent]
 
         print(f"\n📊 Stats for {agent}:")
-        print(f"  Transitions: {len(obs)}")
-        print(f"  Obs shape: {obs.shape}")
+        print(f"  Transitions: {n}")
+        print(f"  Obs shape: {obs_shape}")
         print(f"  Actions shape: {actions.shape}")
         print(f"  Rewards shape: {rewards.shape}")
         print(f"  Dones shape: {dones.shape}")
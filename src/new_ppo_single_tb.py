@@ -1,17 +1,23 @@
 import os
+import argparse
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import DummyVecEnv
 from stable_baselines3.common.callbacks import EvalCallback, CheckpointCallback
 from stable_baselines3.common.monitor import Monitor
 from wrapper.single_agent import SingleAgentWrapper
 from env import DeliveryFleetEnv
+from utils.vec_envs import add_vec_env_args, make_vec_env
+from utils.obs_encoding import OBS_DTYPES
+from utils.feature_extractors import binary_obs_policy_kwargs
+from utils.async_eval import AsyncEvalCallback
+from utils.profiling_callback import ProfilingCallback
 
 # Folders for the use
 os.makedirs("models", exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 os.makedirs("checkpoints", exist_ok=True)
 
-def make_env(max_episode_steps=400):
+def make_env(max_episode_steps=400, obs_dtype="float32", others=None, async_others=False):
     # Wrap with Monitor so SB3 logs episode rewards/length
     def _fn():
         env = SingleAgentWrapper(
@@ -21,31 +27,64 @@ def make_env(max_episode_steps=400):
                 num_agents=3,
                 max_orders=5,
                 order_spawn_rate=3,
+                obs_dtype=obs_dtype,
             ),
             control_agent="agent_0",
             max_episode_steps=max_episode_steps,
+            others_policy=others,
+            async_others=async_others,
         )
         return Monitor(env)
     return _fn
 
 def main():
-    # Training vec env
-    venv = DummyVecEnv([make_env(400)])
+    parser = add_vec_env_args(argparse.ArgumentParser())
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32",
+                        help="observation encoding; uint8/packed are cast to float at the policy input")
+    parser.add_argument("--init-from", default=None,
+                        help="start from pretrained policy weights, e.g. models/ppo_bc_pretrained.zip (pretrain_bc.py)")
+    parser.add_argument("--eval-mode", choices=("async", "inline"), default="async",
+                        help="async: score snapshots in worker processes while training continues; "
+                             "inline: SB3 EvalCallback (training pauses)")
+    parser.add_argument("--eval-episodes", type=int, default=200,
+                        help="seeded episodes per checkpoint. Also applies to --eval-mode inline, whose default "
+                             "used to be 5: the blocking eval is 40x slower, pass e.g. --eval-episodes 5 there")
+    parser.add_argument("--eval-workers", type=int, default=2)
+    parser.add_argument("--others", default="random",
+                        help="policy of the non-controlled agents: random, greedy or ppo:<zip> (frozen checkpoint)")
+    parser.add_argument("--async-others", action="store_true",
+                        help="compute background actions on a thread, overlapped with the learner's forward pass")
+    args = parser.parse_args()
+    env_fn = make_env(400, args.obs_dtype, args.others, args.async_others)
 
-    # Separate eval env (same config, deterministic eval)
-    eval_env = DummyVecEnv([make_env(400)])
+    # Training vec env
+    venv = make_vec_env(env_fn, args.num_envs, args.vec_backend, seed=args.seed)
 
     # Callbacks: evaluate every N steps, save best; plus periodic checkpoints
-    eval_cb = EvalCallback(
-        eval_env,
-        best_model_save_path="models",
-        log_path="logs",
-        eval_freq=5_000,              # evaluate every 5k steps
-        deterministic=True,
-        render=False,
-        n_eval_episodes=5,
-    )
-    ckpt_cb = CheckpointCallback(save_freq=10_000, save_path="checkpoints", name_prefix="ppo_agent0")
+    eval_freq = max(5_000 // args.num_envs, 1)   # evaluate every ~5k total steps
+    if args.eval_mode == "async":
+        # delivered orders, delivery rate and pickup-to-dropoff latency go to TensorBoard (eval/)
+        eval_cb = AsyncEvalCallback(
+            env_fn,
+            eval_freq=eval_freq,
+            n_eval_episodes=args.eval_episodes,
+            n_workers=args.eval_workers,
+            log_path="logs",
+            best_model_save_path="models",
+        )
+    else:
+        # Separate eval env (same config, deterministic eval)
+        eval_env = DummyVecEnv([env_fn])
+        eval_cb = EvalCallback(
+            eval_env,
+            best_model_save_path="models",
+            log_path="logs",
+            eval_freq=eval_freq,
+            deterministic=True,
+            render=False,
+            n_eval_episodes=args.eval_episodes,
+        )
+    ckpt_cb = CheckpointCallback(save_freq=max(10_000 // args.num_envs, 1), save_path="checkpoints", name_prefix="ppo_agent0")
 
     model = PPO(
         "MlpPolicy",
@@ -60,11 +99,17 @@ def main():
         ent_coef=0.01,
         clip_range=0.2,
         vf_coef=0.5,
+        seed=args.seed,
+        policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype),
     )
+    if args.init_from:
+        model.set_parameters(args.init_from)
+        print(f"Initialized policy from {args.init_from}")
 
-    model.learn(total_timesteps=200_000, callback=[eval_cb, ckpt_cb])
+    model.learn(total_timesteps=200_000, callback=[eval_cb, ckpt_cb, ProfilingCallback()])
     model.save("models/ppo_agent_0_final.zip")
     print("Saved final model to models/ppo_agent_0_final.zip")
+    venv.close()
 
 if __name__ == "__main__":
     main()
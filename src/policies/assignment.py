@@ -0,0 +1,104 @@
+# Assignment Policy: agent -> order matching with a linear-assignment solver each time the problem changes
+
+import time
+from collections import deque
+from typing import Dict
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from utils.profiling import timed
+
+STAY, UP, DOWN, LEFT, RIGHT, PICKUP, DROPOFF = range(7)
+
+# solver wall times kept in `solve_times` (the most recent ones)
+SOLVE_HISTORY = 10_000
+
+def _step_towards(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Elementwise over [..., 2] (x, y) arrays: move along the axis with the larger delta (x on ties)."""
+    dx = dst[..., 0].astype(np.int32) - src[..., 0]
+    dy = dst[..., 1].astype(np.int32) - src[..., 1]
+    along_x = np.where(dx > 0, RIGHT, LEFT)
+    along_y = np.select([dy > 0, dy < 0], [DOWN, UP], STAY)
+    return np.where((np.abs(dx) >= np.abs(dy)) & (dx != 0), along_x, along_y)
+
+class AssignmentPolicy:
+    """
+    Free agents are matched to waiting orders by minimizing total distance with a
+    linear-assignment solver; carrying agents head to their own order's dropoff.
+    The matching is only re-solved when the problem changes (orders spawn or get
+    picked, agents become free); otherwise the previous assignment is kept.
+
+    By default every re-solve is a full minimum-cost assignment. warm_start=True is an
+    approximate, incremental mode: it keeps every previous (agent, order) pair that is
+    still valid and only solves the leftover agents x leftover orders, so a re-solve
+    after one spawn or pickup is tiny even on large fleets, but the total distance is
+    no longer minimal. Solver wall time is recorded in `solve_times` (one entry per
+    step, the last SOLVE_HISTORY steps).
+
+    With a `nav` (utils.navigation.Navigator) costs are shortest-path distances and moves
+    follow its next-hop table; without one, Manhattan distance and straight-line moves.
+    """
+
+    def __init__(self, env, warm_start: bool = False, nav=None):
+        self.env = env
+        self.warm_start = warm_start
+        self.nav = nav
+        self.agents = list(env.agents)
+        self.assignment: Dict[int, int] = {}     # agent index -> order id
+        self.solve_times = deque(maxlen=SOLVE_HISTORY)
+        self.last_solve_time = 0.0
+        self._problem = None
+
+    def distances(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """[n, 2] x [m, 2] -> int[n, m] distance cost matrix."""
+        if self.nav is not None:
+            return self.nav.distances(src[:, None], dst[None, :]).astype(np.int64)
+        return np.abs(src[:, None, 0] - dst[None, :, 0]) + np.abs(src[:, None, 1] - dst[None, :, 1])
+
+    def _solve(self, free_idx, waiting_ids, positions, pickups) -> Dict[int, int]:
+        assignment = {}
+        if self.warm_start:
+            waiting_set = set(waiting_ids.tolist())
+            free_set = set(free_idx.tolist())
+            assignment = {i: o for i, o in self.assignment.items() if i in free_set and o in waiting_set}
+            taken = set(assignment.values())
+            keep_rows = np.array([i not in assignment for i in free_idx.tolist()], dtype=bool)
+            keep_cols = np.array([o not in taken for o in waiting_ids.tolist()], dtype=bool)
+            free_idx, waiting_ids, pickups = free_idx[keep_rows], waiting_ids[keep_cols], pickups[keep_cols]
+        if len(free_idx) and len(waiting_ids):
+            rows, cols = linear_sum_assignment(self.distances(positions[free_idx], pickups))
+            assignment.update({int(free_idx[r]): int(waiting_ids[c]) for r, c in zip(rows, cols)})
+        return assignment
+
+    @timed("policy.act")
+    def act(self, obs=None) -> Dict[str, int]:
+        env = self.env
+        positions = np.array([env.agent_positions[a] for a in self.agents], dtype=np.int32)
+        carrying = [env.agent_carrying[a] for a in self.agents]
+        waiting = [o for o in env.active_orders.values() if o["status"] == "waiting"]
+        waiting_ids = np.array([o["id"] for o in waiting], dtype=np.int64)
+        free_idx = np.array([i for i, c in enumerate(carrying) if c is None], dtype=np.int64)
+
+        # ----- (Re-)solve only when the set of free agents or waiting orders changed -----
+        problem = (free_idx.tobytes(), waiting_ids.tobytes())
+        start = time.perf_counter()
+        if problem != self._problem:
+            self._problem = problem
+            pickups = np.array([o["pickup"] for o in waiting], dtype=np.int32).reshape(-1, 2)
+            self.assignment = self._solve(free_idx, waiting_ids, positions, pickups)
+        self.last_solve_time = time.perf_counter() - start
+        self.solve_times.append(self.last_solve_time)
+
+        # ----- Targets: own dropoff when carrying, assigned pickup when free -----
+        targets = positions.copy()
+        arrive_action = np.full(len(self.agents), STAY)
+        for i, oid in enumerate(carrying):
+            if oid is not None:
+                targets[i] = env.active_orders[oid]["dropoff"]
+                arrive_action[i] = DROPOFF
+            elif i in self.assignment:
+                targets[i] = env.active_orders[self.assignment[i]]["pickup"]
+                arrive_action[i] = PICKUP
+        moves = self.nav.next_hops(positions, targets) if self.nav is not None else _step_towards(positions, targets)
+        actions = np.where((positions == targets).all(-1), arrive_action, moves)
+        return {a: int(u) for a, u in zip(self.agents, actions)}
@@ -0,0 +1,103 @@
+# Background-fleet policies: act for every agent SingleAgentWrapper does not control, one call per step
+
+import numpy as np
+
+from env import PICKUP, DROPOFF
+from policies.coordinated_greedy import CoordinatedGreedy
+from utils.navigation import navigator_for
+
+
+class GreedyOthers:
+    """
+    CoordinatedGreedy deciding for the whole fleet in one act_lists call. By default it
+    moves along shortest paths and really picks up / drops off, so the background agents
+    compete for orders (the plain greedy defaults never deliver): idle agents are sent to
+    the waiting orders only, and a carrying agent heads for its own order's dropoff.
+    A `policy` passed in is set up the same way (PICKUP / DROPOFF actions, and shortest
+    paths unless it has its own navigator). The wrapped policy's sweep state is reset
+    whenever the env starts a new episode.
+    """
+
+    def __init__(self, env, policy=None, nav=True, pickup_actions=True):
+        self.agents = list(env.possible_agents)
+        self.nav = navigator_for(env) if nav else None
+        self.policy = policy or CoordinatedGreedy(env, nav=self.nav)
+        self.deliver = pickup_actions and self.nav is not None
+        if self.deliver:
+            # a caller's policy is switched to the same delivering setup
+            self.policy.pickup_action, self.policy.dropoff_action = PICKUP, DROPOFF
+            if self.policy.nav is None:
+                self.policy.nav = self.nav
+
+    def __call__(self, env):
+        if env.t == 0:
+            self.policy.path_idx[:] = 0
+        if not self.deliver:
+            return self.policy.act_env(env)
+        positions = [tuple(env.agent_positions[a]) for a in self.agents]
+        carried = [env.agent_carrying[a] for a in self.agents]
+        waiting = [o for o in env.orders if o["status"] == "waiting"]
+        actions = self.policy.act_lists(positions, [False] * len(self.agents),
+                                        [tuple(o["pickup"]) for o in waiting],
+                                        [tuple(o["dropoff"]) for o in waiting])
+        dropoffs = {o["id"]: tuple(o["dropoff"]) for o in env.orders}
+        for i, order_id in enumerate(carried):
+            if order_id is None or order_id not in dropoffs:
+                continue
+            target = dropoffs[order_id]
+            actions[i] = DROPOFF if positions[i] == target else self.nav.next_hop_cell(positions[i], target)
+        return actions
+
+
+class PPOOthers:
+    """
+    Frozen SB3 policy acting for every agent with one batched predict() over the joint
+    observation. A shared-policy checkpoint (egocentric / entities obs) fits best: with
+    plain grid obs every agent sees the same input, so all of them get the same action.
+    """
+
+    def __init__(self, env, model, deterministic=True):
+        if isinstance(model, str):
+            from stable_baselines3 import PPO
+            model = PPO.load(model, device="cpu")
+        expected = int(np.prod(model.observation_space.shape))
+        got = int(np.prod(env.joint_observation().shape[1:]))
+        if expected != got:
+            raise ValueError(f"Background policy expects {expected} obs features, the env gives {got}")
+        self.model = model
+        self.deterministic = deterministic
+
+    def __call__(self, env):
+        obs = env.joint_observation()
+        actions, _ = self.model.predict(obs.reshape(len(obs), -1), deterministic=self.deterministic)
+        return actions.tolist()
+
+
+def make_others_policy(spec, env):
+    """
+    Background policy for `env` from:
+      None / "random"        -> None (the wrapper's own seeded random sampler)
+      "greedy"               -> GreedyOthers
+      "ppo:<zip>"            -> PPOOthers on that checkpoint
+      a CoordinatedGreedy    -> GreedyOthers around it
+      an SB3 model           -> PPOOthers around it
+      any callable(env)      -> used as is; must return one action per agent (the controlled
+                                agent's entry is ignored)
+    Specs are plain strings so env factories stay picklable for subprocess VecEnvs.
+    """
+    if spec is None or spec == "random":
+        return None
+    if isinstance(spec, str):
+        kind, _, path = spec.partition(":")
+        if kind == "greedy":
+            return GreedyOthers(env)
+        if kind == "ppo" and path:
+            return PPOOthers(env, path)
+        raise ValueError(f"Unknown background policy {spec!r} (expected random, greedy or ppo:<path>)")
+    if isinstance(spec, CoordinatedGreedy):
+        return GreedyOthers(env, policy=spec)
+    if hasattr(spec, "predict"):
+        return PPOOthers(env, spec)
+    if callable(spec):
+        return spec
+    raise TypeError(f"Background policy must be a spec string, a policy or a callable, got {type(spec).__name__}")
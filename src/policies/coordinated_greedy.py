@@ -1,99 +1,217 @@
 # Coordinated Greedy Policy for Multi-Agent Pickup and Delivery
 
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List
 import random
+import numpy as np
+
+from batched_env import WAITING, PICKED
+from utils.profiling import timed
 
 STAY, UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3, 4
 DEFAULT_PICKUP, DEFAULT_DROPOFF = STAY, STAY
 
-def _move_towards(src: Tuple[int,int], dst: Tuple[int,int]) -> int:
-    (r0,c0),(r1,c1)=src,dst
-    dr,dc = r1-r0, c1-c0
+# Large enough to never win an argmin over Manhattan distances
+_FAR = np.iinfo(np.int32).max
+
+# Single-env decisions with at most this many agent x order pairs run in plain Python:
+# below it NumPy's fixed per-call overhead costs more than the loops it replaces
+SCALAR_MAX_PAIRS = 8192
+
+def _move_towards(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Elementwise over [..., 2] coordinate arrays: step along the axis with the larger delta (first axis on ties)."""
+    dr = dst[..., 0].astype(np.int32) - src[..., 0]
+    dc = dst[..., 1].astype(np.int32) - src[..., 1]
+    along_r = np.select([dr > 0, dr < 0, dc > 0, dc < 0], [DOWN, UP, RIGHT, LEFT], STAY)
+    along_c = np.where(dc > 0, RIGHT, LEFT)
+    return np.where(np.abs(dr) >= np.abs(dc), along_r, along_c)
+
+def _manhattan(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """[B, A, 2] x [B, M, 2] -> [B, A, M] Manhattan distances."""
+    return np.abs(src[:, :, None, 0] - dst[:, None, :, 0]) + np.abs(src[:, :, None, 1] - dst[:, None, :, 1])
+
+def _closest(dist: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Index of the nearest allowed target along the last axis (first one on ties)."""
+    return np.argmin(np.where(mask, dist, _FAR), axis=-1)
+
+def _move_towards_one(src, dst) -> int:
+    """Scalar `_move_towards`."""
+    dr, dc = dst[0] - src[0], dst[1] - src[1]
     if abs(dr) >= abs(dc):
-        if dr>0: return DOWN
-        if dr<0: return UP
-        if dc>0: return RIGHT
-        if dc<0: return LEFT
-        return STAY
-    else:
-        if dc>0: return RIGHT
-        if dc<0: return LEFT
-        if dr>0: return DOWN
-        if dr<0: return UP
+        if dr > 0: return DOWN
+        if dr < 0: return UP
+        if dc > 0: return RIGHT
+        if dc < 0: return LEFT
         return STAY
+    return RIGHT if dc > 0 else LEFT
 
-def _closest(src: Tuple[int,int], targets: List[Tuple[int,int]]) -> Optional[Tuple[int,int]]:
-    if not targets: return None
-    return min(targets, key=lambda t: abs(t[0]-src[0])+abs(t[1]-src[1]))
+def _closest_one(src, targets):
+    """Scalar `_closest`: nearest of `targets` (first one on ties)."""
+    r, c = src
+    return min(targets, key=lambda t: abs(t[0] - r) + abs(t[1] - c))
 
 class CoordinatedGreedy:
-    def __init__(self, env, seed=0):
+    """
+    Each agent delivers to the nearest dropoff while carrying, otherwise heads for the
+    nearest pickup in its column zone (any pickup if its zone is empty), otherwise sweeps
+    its zone. Decisions for all agents (and all envs of a batch) are computed with
+    broadcasting over agent x order distance matrices.
+
+    Works on a DeliveryFleetEnv (`act` / `act_env`, plain Python for small fleets) or on a
+    BatchedDeliveryCore (`act_batch`).
+    With a `nav` (utils.navigation.Navigator) moves follow its shortest-path next-hop
+    table instead of raw coordinate deltas.
+    """
+
+    def __init__(self, env, seed=0, nav=None):
         random.seed(seed)
         self.env = env
+        self.nav = nav
         self.grid_size = getattr(env,"grid_size",8)
-        self.agents = list(env.agents)
+        self.agents = list(getattr(env, "agents", None) or [f"agent_{i}" for i in range(env.num_agents)])
         self.num_agents = len(self.agents)
         self.pickup_action = getattr(env,"pickup_action",DEFAULT_PICKUP)
         self.dropoff_action = getattr(env,"dropoff_action",DEFAULT_DROPOFF)
 
         cols_per = max(1,self.grid_size//max(1,self.num_agents))
-        self.zones = {}
-        for i,a in enumerate(self.agents):
+        self.zones = np.zeros((self.num_agents, 2), dtype=np.int32)
+        for i in range(self.num_agents):
             c0=i*cols_per
             c1=self.grid_size-1 if i==self.num_agents-1 else min(self.grid_size-1,c0+cols_per-1)
-            self.zones[a]=(c0,c1)
+            self.zones[i]=(c0,c1)
 
-        self.paths={}
-        for a,(c0,c1) in self.zones.items():
+        # Boustrophedon sweep of each zone, padded to a common length: paths[a, k] = (r, c).
+        # Agents beyond the grid width get an empty zone and sweep the last column instead.
+        paths=[]
+        for c0,c1 in self.zones.tolist():
             path=[]
             for r in range(self.grid_size):
-                cols=range(c0,c1+1)
+                cols=range(min(c0,c1),c1+1)
                 cols=cols if r%2==0 else reversed(list(cols))
                 for c in cols:
                     path.append((r,c))
-            self.paths[a]=path
-        self.path_idx={a:0 for a in self.agents}
-
-    def _extract_targets(self):
-        pickups=[]
-        dropoffs=[]
-        orders=getattr(self.env,"orders",None)
-        if orders:
-            for o in orders:
-                if "pickup" in o and "dropoff" in o:
-                    pickups.append(tuple(o["pickup"]))
-                    dropoffs.append(tuple(o["dropoff"]))
-        return pickups, dropoffs
+            paths.append(path)
+        self.path_len = np.array([len(p) for p in paths], dtype=np.int64)
+        self.paths = np.zeros((self.num_agents, self.path_len.max(), 2), dtype=np.int32)
+        for i, path in enumerate(paths):
+            self.paths[i, :len(path)] = path
+        self.path_idx = np.zeros((1, self.num_agents), dtype=np.int64)
+        # the same tables as Python lists for the scalar path
+        self._zone_list = [tuple(z) for z in self.zones.tolist()]
+        self._path_list = paths
 
-    def act(self, obs: Dict[str, object]) -> Dict[str,int]:
-        pickups, dropoffs = self._extract_targets()
-        positions = getattr(self.env,"agent_positions",{})
-        carrying = getattr(self.env,"agent_carrying",{})
-
-        actions={}
-        for a in self.agents:
-            pos = positions.get(a)
-            if pos is None:
-                actions[a]=STAY
-                continue
-            if carrying.get(a):
-                if dropoffs:
-                    tgt=_closest(pos,dropoffs)
-                    actions[a]=self.env.dropoff_action if tgt==pos else _move_towards(pos,tgt)
-                    continue
-            if pickups:
-                zone=self.zones[a]
-                in_zone=[p for p in pickups if zone[0]<=p[1]<=zone[1]]
-                tgt=_closest(pos,in_zone) if in_zone else _closest(pos,pickups)
-                actions[a]=self.env.pickup_action if tgt==pos else _move_towards(pos,tgt)
+    @timed("policy.act")
+    def act_arrays(self, positions, carrying, pickups, dropoffs, active) -> np.ndarray:
+        """
+        Batched decision rule.
+          positions  int[B, A, 2]   agent cells
+          carrying   bool[B, A]     whether the agent counts as carrying
+          pickups    int[B, M, 2]   order pickup cells
+          dropoffs   int[B, M, 2]   order dropoff cells
+          active     bool[B, M]     which order slots are targets
+        Returns int64[B, A] actions and advances the per-env sweep state.
+        """
+        positions = np.asarray(positions, dtype=np.int32)
+        B = positions.shape[0]
+        if pickups.shape[1] == 0:
+            # keep argmin well-defined with a single inactive slot
+            pickups = dropoffs = np.zeros((B, 1, 2), dtype=np.int32)
+            active = np.zeros((B, 1), dtype=bool)
+        if self.path_idx.shape[0] != B:
+            self.path_idx = np.zeros((B, self.num_agents), dtype=np.int64)
+
+        any_order = active.any(axis=1)[:, None]                                    # [B, 1]
+        d_pick = _manhattan(positions, pickups)                                   # [B, A, M]
+        d_drop = _manhattan(positions, dropoffs)
+
+        # Carrying: nearest dropoff among all targets
+        drop_tgt = np.take_along_axis(dropoffs, _closest(d_drop, active[:, None, :])[..., None], axis=1)
+
+        # Otherwise: nearest pickup in the agent's zone, falling back to any pickup
+        in_zone = (
+            active[:, None, :]
+            & (pickups[:, None, :, 1] >= self.zones[None, :, 0, None])
+            & (pickups[:, None, :, 1] <= self.zones[None, :, 1, None])
+        )
+        zone_mask = np.where(in_zone.any(-1, keepdims=True), in_zone, active[:, None, :])
+        pick_tgt = np.take_along_axis(pickups, _closest(d_pick, zone_mask)[..., None], axis=1)
+
+        # No targets at all: sweep the zone, advancing past goals already reached
+        agent_ids = np.arange(self.num_agents)
+        goal = self.paths[agent_ids, self.path_idx]
+        sweeping = np.broadcast_to(~any_order, carrying.shape).copy()
+        at_goal = sweeping & (positions == goal).all(-1)
+        self.path_idx = np.where(at_goal, (self.path_idx + 1) % self.path_len, self.path_idx)
+        goal = self.paths[agent_ids, self.path_idx]
+
+        deliver = carrying & any_order
+        target = np.where(deliver[..., None], drop_tgt, np.where(sweeping[..., None], goal, pick_tgt))
+        actions = self.nav.next_hops(positions, target) if self.nav is not None else _move_towards(positions, target)
+        arrived = ~sweeping & (positions == target).all(-1)
+        actions = np.where(arrived, np.where(deliver, self.dropoff_action, self.pickup_action), actions)
+        return actions.astype(np.int64)
+
+    @timed("policy.act")
+    def _act_scalar(self, positions, carrying, pickups, dropoffs):
+        """`act_arrays` for one env on Python lists (same decisions, same sweep state)."""
+        if self.path_idx.shape[0] != 1:
+            self.path_idx = np.zeros((1, self.num_agents), dtype=np.int64)
+        path_idx = self.path_idx[0]
+        actions = []
+        for i, pos in enumerate(positions):
+            if not pickups:
+                # no targets: sweep the zone
+                path = self._path_list[i]
+                if pos == path[path_idx[i]]:
+                    path_idx[i] = (path_idx[i] + 1) % len(path)
+                goal = path[path_idx[i]]
+                actions.append(self.nav.next_hop_cell(pos, goal) if self.nav is not None else _move_towards_one(pos, goal))
                 continue
-            # fallback sweep
-            path=self.paths[a]
-            idx=self.path_idx[a]
-            goal=path[idx]
-            if pos==goal:
-                idx=(idx+1)%len(path)
-                self.path_idx[a]=idx
-                goal=path[idx]
-            actions[a]=_move_towards(pos,goal)
+            if carrying[i]:
+                target, arrival = _closest_one(pos, dropoffs), self.dropoff_action
+            else:
+                c0, c1 = self._zone_list[i]
+                in_zone = [p for p in pickups if c0 <= p[1] <= c1]
+                target, arrival = _closest_one(pos, in_zone or pickups), self.pickup_action
+            if pos == target:
+                actions.append(arrival)
+            else:
+                actions.append(self.nav.next_hop_cell(pos, target) if self.nav is not None
+                               else _move_towards_one(pos, target))
         return actions
+
+    def act_env(self, env) -> List[int]:
+        """Actions (in agent order) for a DeliveryFleetEnv's current state."""
+        positions = getattr(env,"agent_positions",{})
+        carrying = getattr(env,"agent_carrying",{})
+        orders = list(getattr(env,"orders",None) or [])
+
+        if any(positions.get(a) is None for a in self.agents):
+            return [STAY] * self.num_agents
+        pos = [tuple(positions[a]) for a in self.agents]
+        # a carried order id of 0 is falsy and counts as not carrying, as it always has
+        carry = [bool(carrying.get(a)) for a in self.agents]
+        pickups = [tuple(o["pickup"]) for o in orders]
+        dropoffs = [tuple(o["dropoff"]) for o in orders]
+        return self.act_lists(pos, carry, pickups, dropoffs)
+
+    def act_lists(self, pos, carry, pickups, dropoffs) -> List[int]:
+        """One env's decision from lists of agent cells / carrying flags and order pickup / dropoff cells."""
+        if self.num_agents * len(pickups) <= SCALAR_MAX_PAIRS:
+            return self._act_scalar(pos, carry, pickups, dropoffs)
+
+        actions = self.act_arrays(
+            np.array([pos], dtype=np.int32),
+            np.array([carry]),
+            np.array([pickups], dtype=np.int32).reshape(1, -1, 2),
+            np.array([dropoffs], dtype=np.int32).reshape(1, -1, 2),
+            np.ones((1, len(pickups)), dtype=bool),
+        )[0]
+        return actions.tolist()
+
+    def act(self, obs: Dict[str, object]) -> Dict[str,int]:
+        return dict(zip(self.agents, self.act_env(self.env)))
+
+    def act_batch(self, core) -> np.ndarray:
+        """Actions int64[B, A] for every env of a BatchedDeliveryCore."""
+        active = (core.order_status == WAITING) | (core.order_status == PICKED)
+        return self.act_arrays(core.positions, core.carrying > 0, core.order_pickup, core.order_dropoff, active)
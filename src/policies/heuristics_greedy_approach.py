@@ -1,8 +1,11 @@
 # Greedy Heuristic Policy for Single-Agent Pickup and Delivery
 
 import random
+from utils.profiling import timed
 
-def self_policy(env, agent):
+@timed("policy.act")
+def self_policy(env, agent, nav=None, rng=None):
+    # rng: NumPy Generator for the random move when no order waits (default: the global `random`)
     ax, ay = env.agent_positions[agent]
     carrying = env.agent_carrying[agent] is not None
     
@@ -19,12 +22,16 @@ def self_policy(env, agent):
         waiting = [o for o in env.orders if o["status"] == "waiting"]
         
         if not waiting:
-            return random.randint(0, 4)
+            return int(rng.integers(0, 5)) if rng is not None else random.randint(0, 4)
         
         order = min(waiting, key=lambda o: abs(o['pickup'][0] - ax) + abs(o['pickup'][1]-ay))
     
         tx, ty = order["pickup"]
     
+    # precomputed next hop (utils.navigation.Navigator), same moves as below on an open grid
+    if nav is not None:
+        return nav.next_hop_cell((ax, ay), (tx, ty))
+    
     if tx > ax: return 4
     if tx < ax: return 3
     if ty > ay: return 2
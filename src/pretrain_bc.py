@@ -0,0 +1,81 @@
+import os
+import time
+import argparse
+import numpy as np
+import torch
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
+from new_ppo_single_tb import make_env
+from utils.replay_dataset import ReplayDataset, prefetch
+from utils.obs_encoding import OBS_DTYPES, pack_obs, packed_size
+from utils.feature_extractors import binary_obs_policy_kwargs
+
+# Behavior cloning: fit the PPO actor to the greedy's actions from a replay dataset
+# (collect it with run_coordinated_collect.py --pickup-actions --nav), then start PPO
+# from the result: python src/new_ppo_single_tb.py --init-from models/ppo_bc_pretrained.zip
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pretrain the PPO policy on greedy demonstrations")
+    parser.add_argument("--data", default="data/replay_greedy_coordinated", help="chunked replay dataset dir")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--ent-coef", type=float, default=0.0, help="entropy bonus, keeps the policy from collapsing")
+    parser.add_argument("--prefetch", type=int, default=4, help="minibatches prepared ahead by the loader thread")
+    parser.add_argument("--agent", default="agent_0",
+                        help="agent whose demonstrations are cloned: the PPO run controls agent_0 and its grid obs "
+                             "has no self channel, so other agents' rows share its inputs with different actions")
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32", help="must match the PPO run")
+    parser.add_argument("--out", default="models/ppo_bc_pretrained.zip")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    ds = ReplayDataset(args.data, seed=args.seed)
+
+    # Same env and policy architecture as new_ppo_single_tb.py, so its --init-from can load the weights
+    venv = DummyVecEnv([make_env(400, args.obs_dtype)])
+    model = PPO("MlpPolicy", venv, seed=args.seed, policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype))
+    policy = model.policy
+    packed = args.obs_dtype == "packed"
+    expected = packed_size(ds.obs_shape) if packed else int(np.prod(ds.obs_shape))
+    if args.agent not in ds.agents:
+        raise ValueError(f"No {args.agent} in {args.data} (agents: {', '.join(ds.agents)})")
+    if int(np.prod(venv.observation_space.shape)) != expected:
+        raise ValueError(f"Dataset obs {ds.obs_shape} don't match the env's observation space "
+                         f"{venv.observation_space.shape} (collect with the same grid size)")
+
+    def to_tensors(batch):
+        # runs on the loader thread: decode and move the next minibatch while the current one trains
+        obs = batch["obs"].reshape(len(batch["obs"]), -1)
+        obs = pack_obs(obs) if packed else obs
+        return (torch.as_tensor(obs, device=policy.device),
+                torch.as_tensor(batch["actions"], device=policy.device))
+
+    optimizer = torch.optim.Adam(policy.parameters(), lr=args.lr)
+    policy.set_training_mode(True)
+    print(f"Behavior cloning on {ds.num_transitions(args.agent)} {args.agent} transitions from {args.data}")
+    for epoch in range(1, args.epochs + 1):
+        start = time.perf_counter()
+        total_loss = correct = seen = 0
+        for obs, actions in prefetch(ds.iter_batches(args.batch_size, agent=args.agent), depth=args.prefetch, transform=to_tensors):
+            dist = policy.get_distribution(obs)
+            loss = -dist.log_prob(actions).mean() - args.ent_coef * dist.entropy().mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(actions)
+            correct += (dist.distribution.probs.argmax(dim=1) == actions).sum().item()
+            seen += len(actions)
+        elapsed = time.perf_counter() - start
+        print(f"epoch {epoch}: loss={total_loss / seen:.4f}, action accuracy={correct / seen:.2%}, "
+              f"{seen / elapsed:,.0f} samples/s")
+
+    model.save(args.out)
+    print(f"Saved pretrained policy to {args.out}")
+    venv.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,133 @@
-from env import DeliveryFleetEnv
+import argparse
+import os
+import shutil
+import time
+from multiprocessing import get_context
+
+import numpy as np
+
+from env import DeliveryFleetEnv, PICKUP, DROPOFF
 from policies.coordinated_greedy import CoordinatedGreedy
+from utils.navigation import navigator_for
 from utils.replay_buffer import PerAgentReplayBuffer
+from utils.replay_dataset import merge_datasets
 
-def main():
-    env = DeliveryFleetEnv(
-        grid_size=8,
-        num_agents=3,
-        max_orders=6,
-        order_spawn_rate=3,
-    )
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect greedy demonstrations into a chunked replay dataset")
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--steps-per-ep", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=None,
+                        help="episodes per shard (one worker task); default: enough to fill a chunk, "
+                             "but at most an even split over --workers")
+    parser.add_argument("--chunk-size", type=int, default=65_536, help="transitions per on-disk chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data/replay_greedy_coordinated")
+    parser.add_argument("--grid-size", type=int, default=8)
+    parser.add_argument("--num-agents", type=int, default=3)
+    parser.add_argument("--max-orders", type=int, default=6)
+    parser.add_argument("--order-spawn-rate", type=int, default=3)
+    parser.add_argument("--pickup-actions", action="store_true",
+                        help="act PICKUP/DROPOFF on arrival instead of the greedy's default STAY "
+                             "(needed for behavior-cloning data, see pretrain_bc.py)")
+    parser.add_argument("--nav", action="store_true", help="move along shortest paths (utils.navigation)")
+    return parser.parse_args()
 
-    policy = CoordinatedGreedy(env, seed=0)
-    rb = PerAgentReplayBuffer(capacity=200_000)
-    episodes = 10
-    steps_per_ep = 100
+def collect_shard(task):
+    """Worker: run `episodes` greedy episodes with its own env/policy/seed into one shard dataset."""
+    shard_dir, seed, episodes, steps_per_ep, env_kwargs, chunk_size, pickup_actions, nav = task
+    env = DeliveryFleetEnv(**env_kwargs)
+    policy = CoordinatedGreedy(env, seed=seed, nav=navigator_for(env) if nav else None)
+    if pickup_actions:
+        policy.pickup_action, policy.dropoff_action = PICKUP, DROPOFF
+    rb = PerAgentReplayBuffer(capacity=0, stream_dir=shard_dir, chunk_size=chunk_size)
 
+    transitions = reward_sum = spawned = delivered = 0
     for ep in range(episodes):
-        obs = env.reset()
-        ep_reward_sum = 0.0
-        delivered = 0
-        spawned = 0
+        obs, _ = env.reset(seed=seed if ep == 0 else None)
+        obs = {a: o.copy() for a, o in obs.items()}
 
         for t in range(steps_per_ep):
             actions = policy.act(obs)
-            next_obs, rewards, dones, infos = env.step(actions)
+            next_obs, rewards, terminations, truncations, infos = env.step(actions)
+            dones = {a: terminations[a] or truncations[a] for a in env.agents}
+            reward_sum += sum(rewards.values())
 
-            ep_reward_sum += sum(rewards.values())
-
-            # track orders
-            spawned = max(spawned, env.next_order_id)
-            delivered = spawned - len(env.orders) - sum(1 for agent in env.agent_carrying.values() if agent is not None)
-
-            rb.add_step(obs, actions, rewards, next_obs, dones)
-            obs = next_obs
+            # the episode is cut at steps_per_ep even if the env would go on (env max_steps is longer)
+            cut = t == steps_per_ep - 1
+            rb.add_step(obs, actions, rewards, next_obs, dones, boundaries={a: cut for a in env.agents})
+            transitions += len(actions)
+            # env observations are views of its live buffer, so keep a snapshot for the next transition
+            obs = {a: o.copy() for a, o in next_obs.items()}
             if all(dones.values()):
                 break
 
-        delivery_rate = delivered / spawned if spawned > 0 else 0.0
-        avg_agent_reward = ep_reward_sum / env._num_agents
-
-        print(
-            f"[ep {ep+1}/{episodes}] "
-            f"total reward={ep_reward_sum:.2f}, "
-            f"avg/agent={avg_agent_reward:.2f}, "
-            f"orders spawned={spawned}, "
-            f"delivered={delivered}, "
-            f"success_rate={delivery_rate:.2%}"
-        )
-
-    path = "data/replay_greedy_coordinated.npz"
-    rb.save_npz(path)
-    print(f"Saved replay buffer: {path} (transitions: {rb.size()})")
+        spawned += env.next_order_id
+        delivered += len(env.order_history)
+
+    rb.close()
+    return dict(shard=shard_dir, episodes=episodes, transitions=transitions,
+                reward=reward_sum, spawned=spawned, delivered=delivered)
+
+def main():
+    args = parse_args()
+    env_kwargs = dict(
+        grid_size=args.grid_size,
+        num_agents=args.num_agents,
+        max_orders=args.max_orders,
+        order_spawn_rate=args.order_spawn_rate,
+        # binary grid channels: the dataset stores the env's uint8 obs as they come
+        obs_dtype="uint8",
+    )
+
+    if args.shard_size is None:
+        # shards are merged chunk file by chunk file, so small shards would leave many tiny files
+        fill_chunk = -(-args.chunk_size // args.steps_per_ep)
+        args.shard_size = max(1, min(fill_chunk, -(-args.episodes // max(1, args.workers))))
+
+    # one independent seed per shard, reproducible for a given --seed
+    n_shards = -(-args.episodes // args.shard_size)
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(args.seed).spawn(n_shards)]
+    shard_root = args.out + ".shards"
+    shutil.rmtree(shard_root, ignore_errors=True)
+    tasks = []
+    for k in range(n_shards):
+        episodes = min(args.shard_size, args.episodes - k * args.shard_size)
+        shard_dir = os.path.join(shard_root, f"shard_{k:05d}")
+        tasks.append((shard_dir, seeds[k], episodes, args.steps_per_ep, env_kwargs, args.chunk_size,
+                      args.pickup_actions, args.nav))
+
+    start = time.perf_counter()
+    totals = dict(episodes=0, transitions=0, reward=0.0, spawned=0, delivered=0)
+    workers = max(1, min(args.workers, n_shards))
+    with get_context("spawn").Pool(workers) as pool:
+        for done, res in enumerate(pool.imap_unordered(collect_shard, tasks), 1):
+            for key in totals:
+                totals[key] += res[key]
+            elapsed = time.perf_counter() - start
+            print(
+                f"[shard {done}/{n_shards}] "
+                f"episodes={totals['episodes']}/{args.episodes}, "
+                f"transitions={totals['transitions']}, "
+                f"throughput={totals['transitions'] / elapsed:,.0f} transitions/s"
+            )
+
+    if os.path.exists(args.out):
+        shutil.rmtree(args.out)
+    ds = merge_datasets([t[0] for t in tasks], args.out)
+    shutil.rmtree(shard_root, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    delivery_rate = totals["delivered"] / totals["spawned"] if totals["spawned"] > 0 else 0.0
+    avg_agent_reward = totals["reward"] / max(1, totals["episodes"]) / args.num_agents
+    print(
+        f"Saved replay dataset: {args.out} (transitions: {len(ds)}) in {elapsed:.1f}s "
+        f"({len(ds) / elapsed:,.0f} transitions/s, {workers} workers)\n"
+        f"avg reward/agent/episode={avg_agent_reward:.2f}, "
+        f"orders spawned={totals['spawned']}, "
+        f"delivered={totals['delivered']}, "
+        f"success_rate={delivery_rate:.2%}"
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,107 @@
+import os
+import argparse
+import numpy as np
+from stable_baselines3 import PPO
+from wrapper.shared_policy_vec_env import SharedPolicyVecEnv
+from env import DeliveryFleetEnv
+from utils.obs_encoding import OBS_DTYPES
+from utils.feature_extractors import binary_obs_policy_kwargs
+from utils.profiling_callback import ProfilingCallback
+
+# Curriculum on the shared policy: obs/action shapes don't depend on grid size or agent
+# count, so each stage warm-starts from the previous stage's checkpoint. A stage is
+# promoted as soon as its eval success rate (delivered / spawned orders) reaches
+# --promote-at, or when its timestep budget runs out.
+
+curriculum = [
+    dict(grid_size=5, num_agents=2, max_orders=3, order_spawn_rate=2),
+    dict(grid_size=6, num_agents=3, max_orders=4, order_spawn_rate=3),
+    dict(grid_size=8, num_agents=4, max_orders=5, order_spawn_rate=4),
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Curriculum PPO with warm-start and success-based promotion")
+    parser.add_argument("--num-envs", type=int, default=8, help="fleets per batch (mixed across stages)")
+    parser.add_argument("--mix", type=float, default=0.25,
+                        help="fraction of the batch's envs drawn from earlier stages (replay against forgetting)")
+    parser.add_argument("--obs-mode", choices=("egocentric", "entities"), default="egocentric")
+    parser.add_argument("--view-size", type=int, default=7)
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32")
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--stage-timesteps", type=int, default=200_000, help="budget per stage (agent steps)")
+    parser.add_argument("--eval-every", type=int, default=20_000, help="agent steps between promotion checks")
+    parser.add_argument("--eval-episodes", type=int, default=10)
+    parser.add_argument("--promote-at", type=float, default=0.8, help="eval success rate needed for promotion")
+    parser.add_argument("--out-dir", default="models/curriculum")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def stage_env_kwargs(stage, num_envs, mix, common):
+    """Per-env kwargs for one stage's batch: mostly `stage`, `mix` of it cycled over earlier stages."""
+    n_old = int(round(mix * num_envs)) if stage > 0 else 0
+    n_old = min(n_old, num_envs - 1)
+    stages = [stage] * (num_envs - n_old) + [k % stage for k in range(n_old)]
+    return [dict(curriculum[k], **common) for k in stages]
+
+def evaluate(model, env_kwargs, episodes, seed):
+    """Mean fraction of spawned orders delivered per episode, acting deterministically."""
+    env = DeliveryFleetEnv(**env_kwargs)
+    rates = []
+    for ep in range(episodes):
+        env.reset(seed=seed + ep)
+        done = False
+        while not done:
+            obs = env.joint_observation().reshape(len(env.agents), -1)
+            actions, _ = model.predict(obs, deterministic=True)
+            _, _, terminations, truncations, _ = env.step(dict(zip(env.agents, actions.tolist())))
+            done = all(terminations[a] or truncations[a] for a in env.agents)
+        rates.append(len(env.order_history) / max(env.next_order_id, 1))
+    return float(np.mean(rates))
+
+def main():
+    args = parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    common = dict(obs_mode=args.obs_mode, view_size=args.view_size, obs_dtype=args.obs_dtype, max_steps=args.max_steps)
+
+    model, checkpoint, report = None, None, []
+    for stage, stage_kwargs in enumerate(curriculum):
+        print(f"\n--- Curriculum Stage {stage + 1}: {stage_kwargs} ---")
+        venv = SharedPolicyVecEnv(args.num_envs, stage_env_kwargs(stage, args.num_envs, args.mix, common),
+                                  seed=args.seed + stage)
+        if checkpoint is None:
+            model = PPO(
+                "MlpPolicy",
+                venv,
+                verbose=1,
+                n_steps=max(16, 2048 // venv.num_envs),
+                batch_size=256,
+                tensorboard_log="./tensorboard_curriculum/",
+                seed=args.seed,
+                policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype),
+            )
+        else:
+            # set_env() needs an identical row count, so rebind the weights through load()
+            model = PPO.load(checkpoint, env=venv, tensorboard_log="./tensorboard_curriculum/")
+
+        eval_kwargs = dict(stage_kwargs, **common)
+        start, success = model.num_timesteps, 0.0
+        while model.num_timesteps - start < args.stage_timesteps:
+            model.learn(total_timesteps=args.eval_every, reset_num_timesteps=False,
+                        tb_log_name=f"stage_{stage + 1}", callback=ProfilingCallback())
+            success = evaluate(model, eval_kwargs, args.eval_episodes, seed=10_000 * (stage + 1))
+            print(f"stage {stage + 1}: {model.num_timesteps - start} steps, eval success {success:.2f}")
+            if success >= args.promote_at:
+                break
+
+        checkpoint = os.path.join(args.out_dir, f"stage_{stage + 1}.zip")
+        model.save(checkpoint)
+        report.append((stage + 1, model.num_timesteps - start, success, success >= args.promote_at))
+        venv.close()
+
+    print("\nstage  timesteps  success  promoted")
+    for stage, steps, success, promoted in report:
+        print(f"{stage:5d}  {steps:9d}  {success:7.2f}  {'yes' if promoted else 'budget'}")
+    print(f"Final policy saved to {checkpoint}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import argparse
+from functools import partial
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
 from wrapper.multi_agent import MultiAgentWrapper
 from env import DeliveryFleetEnv
+from utils.vec_envs import add_vec_env_args, make_vec_env
+from utils.profiling_callback import ProfilingCallback
 
 curriculum = [
     dict(grid_size  =5, num_agents=2, max_orders=3, order_spawn_rate=2),
@@ -14,14 +17,16 @@ def make_enc(env_kwargs):
 
 
 def main():
+    args = add_vec_env_args(argparse.ArgumentParser()).parse_args()
     total_timesteps_per_stage = 50_000
     for stage, env_kwargs in enumerate(curriculum, 1):
         print(f"\n--- Curriculum Stage {stage}: {env_kwargs} ---")
-        venv = DummyVecEnv([lambda: make_enc(env_kwargs)])
-        model = PPO("MlpPolicy", venv, verbose=1, tensorboard_log="./tensorboard_ma/")
-        model.learn(total_timesteps=total_timesteps_per_stage)
+        venv = make_vec_env(partial(make_enc, env_kwargs), args.num_envs, args.vec_backend, seed=args.seed)
+        model = PPO("MlpPolicy", venv, verbose=1, tensorboard_log="./tensorboard_ma/", seed=args.seed)
+        model.learn(total_timesteps=total_timesteps_per_stage, callback=ProfilingCallback())
         model.save(f"model/ppo_ma_stage_{stage}.zip")
         print(F"Saved model for stage {stage}")
+        venv.close()
         
 if __name__ == "__main__":
     main()
\ No newline at end of file
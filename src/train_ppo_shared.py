@@ -0,0 +1,66 @@
+import os
+import argparse
+from stable_baselines3 import PPO
+from wrapper.shared_policy_vec_env import SharedPolicyVecEnv
+from utils.obs_encoding import OBS_DTYPES
+from utils.feature_extractors import binary_obs_policy_kwargs
+from utils.profiling_callback import ProfilingCallback
+
+# Parameter-sharing PPO: one policy acts for every agent, agents x envs form the batch.
+# A saved model keeps working for other --num-agents values (same obs mode / view size).
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train one PPO policy shared by all agents")
+    parser.add_argument("--num-envs", type=int, default=4, help="fleets stepped per batch; batch rows = envs x agents")
+    parser.add_argument("--num-agents", type=int, default=4)
+    parser.add_argument("--grid-size", type=int, default=8)
+    parser.add_argument("--max-orders", type=int, default=20)
+    parser.add_argument("--order-spawn-rate", type=int, default=3)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--obs-mode", choices=("grid", "egocentric", "entities"), default="egocentric")
+    parser.add_argument("--view-size", type=int, default=7)
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32")
+    parser.add_argument("--timesteps", type=int, default=200_000, help="agent steps (rows x env steps)")
+    parser.add_argument("--load", default=None, help="continue from a saved shared policy")
+    parser.add_argument("--out", default="models/ppo_shared.zip")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    env_kwargs = dict(
+        grid_size=args.grid_size,
+        num_agents=args.num_agents,
+        max_orders=args.max_orders,
+        order_spawn_rate=args.order_spawn_rate,
+        max_steps=args.max_steps,
+        obs_mode=args.obs_mode,
+        view_size=args.view_size,
+        obs_dtype=args.obs_dtype,
+    )
+    venv = SharedPolicyVecEnv(args.num_envs, env_kwargs, seed=args.seed)
+    print(f"{venv.num_fleets} envs x {args.num_agents} agents = {venv.num_envs} rows per policy batch")
+
+    if args.load:
+        model = PPO.load(args.load, env=venv, tensorboard_log="./tensorboard_shared/")
+    else:
+        # keep ~2k samples per rollout whatever the fleet size
+        model = PPO(
+            "MlpPolicy",
+            venv,
+            verbose=1,
+            n_steps=max(16, 2048 // venv.num_envs),
+            batch_size=256,
+            tensorboard_log="./tensorboard_shared/",
+            seed=args.seed,
+            policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype),
+        )
+    model.learn(total_timesteps=args.timesteps, reset_num_timesteps=args.load is None,
+                callback=ProfilingCallback())
+    model.save(args.out)
+    print(f"Saved shared policy to {args.out}")
+    venv.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
 import os
+import argparse
+from functools import partial
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
 from wrapper.single_agent import SingleAgentWrapper
 from env import DeliveryFleetEnv
+from utils.vec_envs import add_vec_env_args, make_vec_env
+from utils.obs_encoding import OBS_DTYPES
+from utils.feature_extractors import binary_obs_policy_kwargs
+from utils.profiling_callback import ProfilingCallback
 
 # Ensure models folder exists
 os.makedirs("models", exist_ok=True)
 
-def make_env():
+def make_env(obs_dtype="float32"):
     return SingleAgentWrapper(
         DeliveryFleetEnv,
         env_kwargs=dict(
@@ -15,23 +20,30 @@ def make_env():
             num_agents=3,
             max_orders=5,
             order_spawn_rate=3,
+            obs_dtype=obs_dtype,
         ),
         control_agent="agent_0"
     )
 
 def main():
+    parser = add_vec_env_args(argparse.ArgumentParser())
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32",
+                        help="observation encoding; uint8/packed are cast to float at the policy input")
+    args = parser.parse_args()
+
     # Wrap environment for SB3
-    venv = DummyVecEnv([make_env])
+    venv = make_vec_env(partial(make_env, args.obs_dtype), args.num_envs, args.vec_backend, seed=args.seed)
 
     # Create PPO model
-    model = PPO("MlpPolicy", venv, verbose=1)
+    model = PPO("MlpPolicy", venv, verbose=1, seed=args.seed, policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype))
 
     # Train the model
-    model.learn(total_timesteps=50_000)
+    model.learn(total_timesteps=50_000, callback=ProfilingCallback())
 
     # Save model
     model.save("models/ppo_agent_0.zip")
     print("Saved PPO model to models/ppo_agent_0.zip")
+    venv.close()
 
 if __name__ == "__main__":
     main()
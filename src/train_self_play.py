@@ -0,0 +1,81 @@
+import os
+import argparse
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import CheckpointCallback
+from wrapper.self_play_vec_env import SelfPlayVecEnv
+from utils.snapshot_pool import SnapshotPool, SnapshotPoolCallback
+from utils.obs_encoding import OBS_DTYPES
+from utils.feature_extractors import binary_obs_policy_kwargs
+from utils.profiling_callback import ProfilingCallback
+
+# Self-play league: the learner controls agent_0, every other agent of an env is played by
+# a frozen snapshot of the learner (or its live weights, --self-prob) sampled per episode.
+# Snapshots are written to --pool-dir every --snapshot-every steps and join the pool at
+# the next rollout; they are loaded lazily into an LRU cache bounded by --cache-mb.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Self-play PPO against a pool of frozen snapshots")
+    parser.add_argument("--num-envs", type=int, default=8)
+    parser.add_argument("--num-agents", type=int, default=3)
+    parser.add_argument("--grid-size", type=int, default=8)
+    parser.add_argument("--max-orders", type=int, default=10)
+    parser.add_argument("--order-spawn-rate", type=int, default=3)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--obs-mode", choices=("grid", "egocentric", "entities"), default="egocentric")
+    parser.add_argument("--view-size", type=int, default=7)
+    parser.add_argument("--obs-dtype", choices=OBS_DTYPES, default="float32")
+    parser.add_argument("--timesteps", type=int, default=200_000)
+    parser.add_argument("--pool-dir", default="checkpoints", help="where snapshots are saved and sampled from")
+    parser.add_argument("--pool-pattern", default="selfplay_*.zip", help="glob of pool snapshots in --pool-dir")
+    parser.add_argument("--snapshot-every", type=int, default=20_000, help="steps between snapshots added to the pool")
+    parser.add_argument("--cache-mb", type=float, default=256.0, help="memory budget of loaded snapshots")
+    parser.add_argument("--self-prob", type=float, default=0.2, help="chance an episode's opponent is the live learner")
+    parser.add_argument("--deterministic-opponents", action="store_true")
+    parser.add_argument("--load", default=None, help="continue from a saved self-play policy")
+    parser.add_argument("--out", default="models/ppo_self_play.zip")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    os.makedirs(args.pool_dir, exist_ok=True)
+    env_kwargs = dict(
+        grid_size=args.grid_size,
+        num_agents=args.num_agents,
+        max_orders=args.max_orders,
+        order_spawn_rate=args.order_spawn_rate,
+        max_steps=args.max_steps,
+        obs_mode=args.obs_mode,
+        view_size=args.view_size,
+        obs_dtype=args.obs_dtype,
+    )
+    pool = SnapshotPool(args.pool_dir, args.pool_pattern, cache_mb=args.cache_mb, self_prob=args.self_prob,
+                        seed=args.seed)
+    venv = SelfPlayVecEnv(args.num_envs, env_kwargs, pool=pool, deterministic_opponents=args.deterministic_opponents,
+                          seed=args.seed)
+    print(f"{venv.num_envs} envs, {pool.refresh()} snapshots in the pool")
+
+    if args.load:
+        model = PPO.load(args.load, env=venv, tensorboard_log="./tensorboard_self_play/")
+    else:
+        model = PPO(
+            "MlpPolicy",
+            venv,
+            verbose=1,
+            n_steps=max(16, 2048 // venv.num_envs),
+            batch_size=256,
+            tensorboard_log="./tensorboard_self_play/",
+            seed=args.seed,
+            policy_kwargs=binary_obs_policy_kwargs(args.obs_dtype),
+        )
+    snapshots = CheckpointCallback(save_freq=max(args.snapshot_every // venv.num_envs, 1), save_path=args.pool_dir,
+                                   name_prefix="selfplay")
+    model.learn(total_timesteps=args.timesteps, reset_num_timesteps=args.load is None,
+                callback=[snapshots, SnapshotPoolCallback(pool), ProfilingCallback()])
+    model.save(args.out)
+    print(f"Saved self-play policy to {args.out}")
+    venv.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# asynchronous policy evaluation: checkpoints are scored in worker processes while training continues
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.logger import TensorBoardOutputFormat
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+EPISODE_STATS = ("reward", "length", "delivered", "delivery_rate", "latency")
+
+_MODELS: Dict[str, object] = {}
+
+
+def _init_worker():
+    # eval workers share the machine with the learner: one intra-op thread each
+    torch.set_num_threads(1)
+
+
+def _fleet_env(env):
+    """The DeliveryFleetEnv under Monitor / SingleAgentWrapper layers."""
+    env = env.unwrapped
+    return getattr(env, "base_env", env)
+
+
+def run_episodes(algo_cls, model_path: str, env_fn: CloudpickleWrapper, seeds: List[int],
+                 deterministic: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Worker task: play one episode per seed with the model saved at `model_path`.
+    All episodes run in lockstep so each step is one batched forward pass.
+    Returns per-episode arrays for EPISODE_STATS; `latency` is the mean
+    pickup-to-dropoff time of the delivered orders (nan if none).
+    """
+    if model_path not in _MODELS:
+        _MODELS.clear()
+        _MODELS[model_path] = algo_cls.load(model_path, device="cpu")
+    model = _MODELS[model_path]
+
+    envs = [env_fn.var() for _ in seeds]
+    obs = np.stack([env.reset(seed=int(seed))[0] for env, seed in zip(envs, seeds)])
+    n = len(envs)
+    running = np.ones(n, dtype=bool)
+    rewards = np.zeros(n)
+    lengths = np.zeros(n, dtype=np.int64)
+    while running.any():
+        actions, _ = model.predict(obs[running], deterministic=deterministic)
+        for i, action in zip(np.flatnonzero(running), actions):
+            obs[i], reward, terminated, truncated, _ = envs[i].step(action)
+            rewards[i] += reward
+            lengths[i] += 1
+            running[i] = not (terminated or truncated)
+
+    stats = {"reward": rewards, "length": lengths}
+    delivered = np.zeros(n, dtype=np.int64)
+    rate = np.zeros(n)
+    latency = np.full(n, np.nan)
+    for i, env in enumerate(envs):
+        fleet = _fleet_env(env)
+        history = fleet.order_history.as_array()
+        delivered[i] = len(history)
+        rate[i] = len(history) / fleet.next_order_id if fleet.next_order_id else 0.0
+        if len(history):
+            cols = fleet.order_history.COLUMNS
+            latency[i] = np.mean(history[:, cols.index("t_delivered")] - history[:, cols.index("t_pickup")])
+        env.close()
+    stats.update(delivered=delivered, delivery_rate=rate, latency=latency)
+    return stats
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Drop-in replacement for SB3's EvalCallback that doesn't stall the learner.
+
+    Every `eval_freq` calls the current model is saved to `snapshot_dir` and its
+    `n_eval_episodes` seeded episodes are split across `n_workers` processes. Finished
+    checkpoints are picked up on later steps: their means go to TensorBoard under eval/ at
+    the checkpoint's step (and to the other logger outputs with the next rollout), all
+    per-episode values go to `<log_path>/evaluations.npz`, and the best snapshot by mean
+    reward is copied to `<best_model_save_path>/best_model.zip`.
+    Every checkpoint uses the same seeds, so checkpoints are compared on identical episodes.
+    At most `max_pending` checkpoints are in flight: while that many are still being scored,
+    new ones are skipped (counted in `skipped`) rather than piling up snapshots and futures.
+    """
+
+    def __init__(self, env_fn, eval_freq: int = 5_000, n_eval_episodes: int = 200, n_workers: int = 2,
+                 episodes_per_task: int = 25, log_path: str = "logs", best_model_save_path: str = None,
+                 snapshot_dir: str = "logs/eval_snapshots", seed: int = 10_000, deterministic: bool = True,
+                 wait_at_end: bool = True, max_pending: int = 1, verbose: int = 1):
+        super().__init__(verbose)
+        self.env_fn = CloudpickleWrapper(env_fn)
+        self.eval_freq = eval_freq
+        self.seeds = [seed + i for i in range(n_eval_episodes)]
+        self.n_workers = n_workers
+        self.episodes_per_task = episodes_per_task
+        self.log_path = log_path
+        self.best_model_save_path = best_model_save_path
+        self.snapshot_dir = snapshot_dir
+        self.deterministic = deterministic
+        self.wait_at_end = wait_at_end
+        self.max_pending = max_pending
+        self.skipped = 0
+        self.best_mean_reward = -np.inf
+        self.evaluations = {"timesteps": []}
+        self.evaluations.update({name: [] for name in EPISODE_STATS})
+        self._pool = None
+        self._pending = []  # (timesteps, snapshot path, futures) in submission order
+
+    def _init_callback(self):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        if self.log_path:
+            os.makedirs(self.log_path, exist_ok=True)
+        if self.best_model_save_path:
+            os.makedirs(self.best_model_save_path, exist_ok=True)
+        self._pool = ProcessPoolExecutor(self.n_workers, mp_context=get_context("spawn"), initializer=_init_worker)
+
+    def _on_step(self) -> bool:
+        self._collect(block=False)
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            if len(self._pending) < self.max_pending:
+                self._submit()
+            else:
+                self.skipped += 1
+                self.logger.record("eval/skipped_checkpoints", self.skipped)
+                if self.verbose:
+                    print(f"Eval @ {self.num_timesteps} steps skipped: {len(self._pending)} checkpoint(s) still running")
+        return True
+
+    def _on_training_end(self):
+        pending = len(self._pending)
+        self._collect(block=self.wait_at_end)
+        if len(self._pending) < pending:
+            # no rollout follows to write the last results
+            self.logger.dump(self.num_timesteps)
+        self._pool.shutdown(wait=self.wait_at_end, cancel_futures=not self.wait_at_end)
+
+    def _submit(self):
+        path = os.path.join(self.snapshot_dir, f"model_{self.num_timesteps}.zip")
+        self.model.save(path)
+        step = self.episodes_per_task
+        futures = [
+            self._pool.submit(run_episodes, type(self.model), path, self.env_fn,
+                              self.seeds[i:i + step], self.deterministic)
+            for i in range(0, len(self.seeds), step)
+        ]
+        self._pending.append((self.num_timesteps, path, futures))
+
+    def _collect(self, block: bool):
+        # report in submission order so evaluations.npz stays sorted by timestep
+        while self._pending and (block or all(f.done() for f in self._pending[0][2])):
+            timesteps, path, futures = self._pending.pop(0)
+            parts = [f.result() for f in futures]
+            self._report(timesteps, path, {k: np.concatenate([p[k] for p in parts]) for k in EPISODE_STATS})
+
+    def _report(self, timesteps: int, path: str, stats: Dict[str, np.ndarray]):
+        means = {k: float(np.nanmean(v)) if np.isfinite(v).any() else float("nan") for k, v in stats.items()}
+        # TensorBoard gets them at the checkpoint's step straight from its writer, without
+        # flushing the other pending scalars; stdout / csv show them with the next rollout
+        writers = [f.writer for f in self.logger.output_formats if isinstance(f, TensorBoardOutputFormat)]
+        for name, value in means.items():
+            for writer in writers:
+                writer.add_scalar(f"eval/mean_{name}", value, timesteps)
+            self.logger.record(f"eval/mean_{name}", value, exclude="tensorboard")
+        self.logger.record("eval/checkpoint_timesteps", timesteps, exclude="tensorboard")
+        for writer in writers:
+            writer.flush()
+        if self.verbose:
+            print(f"Eval @ {timesteps} steps ({len(stats['reward'])} episodes): "
+                  f"reward={means['reward']:.2f} +/- {np.std(stats['reward']):.2f}, "
+                  f"delivered={means['delivered']:.2f}, delivery rate={means['delivery_rate']:.2%}, "
+                  f"latency={means['latency']:.1f} steps")
+
+        self.evaluations["timesteps"].append(timesteps)
+        for name in EPISODE_STATS:
+            self.evaluations[name].append(stats[name])
+        if self.log_path:
+            # `results` / `ep_lengths` keep the EvalCallback file layout
+            np.savez(os.path.join(self.log_path, "evaluations.npz"),
+                     results=np.array(self.evaluations["reward"]),
+                     ep_lengths=np.array(self.evaluations["length"]),
+                     **{k: np.array(v) for k, v in self.evaluations.items()})
+
+        if self.best_model_save_path and means["reward"] > self.best_mean_reward:
+            self.best_mean_reward = means["reward"]
+            shutil.copyfile(path, os.path.join(self.best_model_save_path, "best_model.zip"))
+            if self.verbose:
+                print("New best mean reward!")
+        os.remove(path)
@@ -0,0 +1,56 @@
+# Simultaneous-move conflict resolution with array ops (shared by DeliveryFleetEnv and BatchedDeliveryCore)
+
+from typing import Tuple
+
+import numpy as np
+
+def resolve_moves(cur: np.ndarray, prop: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All agents move at once from distinct cell ids `cur` int64[K] to proposed cell ids `prop`
+    int64[K] (prop == cur for agents that don't move; batched callers offset cell ids per env
+    so envs never interact). Conflicts are resolved as:
+      - swap: two agents exchanging cells both stay
+      - vertex: several agents entering one cell -> the lowest index moves, the rest stay
+      - a cell still held by a staying agent can't be entered
+    Blocked agents stay, which may block the agent entering their cell, and so on down the
+    queue. Each vertex winner points at the agent in the cell it enters, so every queue is a
+    chain ending at a staying agent (blocked) or a free cell (moves); the chains are followed
+    by pointer doubling, O(K log K) overall. Rotations of three or more agents all move.
+    Returns (final cell ids int64[K], blocked bool[K]).
+    """
+    cur = np.asarray(cur, dtype=np.int64)
+    final = np.array(prop, dtype=np.int64)
+    moving = final != cur
+    if not moving.any():
+        return final, moving
+
+    # ----- Swap conflicts: a -> b and b -> a -----
+    span = int(max(cur.max(), final.max())) + 1
+    m = np.flatnonzero(moving)
+    swap = np.isin(cur[m] * span + final[m], final[m] * span + cur[m])
+    final[m[swap]] = cur[m[swap]]
+    moving = final != cur
+
+    # ----- Vertex conflicts: the lowest-index mover into a cell is its only candidate -----
+    movers = np.flatnonzero(moving)
+    _, first = np.unique(final[movers], return_index=True)
+    winners = movers[first]
+    # staying agents and vertex losers are blocked for sure
+    stays = np.ones(len(cur), dtype=bool)
+    stays[winners] = False
+
+    # ----- Chains: a winner moves unless the agent in its target cell ends up staying -----
+    order = np.argsort(cur)
+    slot = np.minimum(np.searchsorted(cur, final[winners], sorter=order), len(cur) - 1)
+    occupant = order[slot]
+    entered = cur[occupant] == final[winners]
+    ptr = np.arange(len(cur))
+    ptr[winners[entered]] = occupant[entered]
+    for _ in range(max(len(cur) - 1, 1).bit_length()):
+        ptr = ptr[ptr]
+    # a chain's end is either a staying agent or a winner into a free cell; rotations
+    # point at one of their own (moving) winners
+    blocked = stays[ptr]
+    final[blocked] = cur[blocked]
+
+    return final, final != np.asarray(prop)
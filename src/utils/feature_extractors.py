@@ -0,0 +1,33 @@
+# SB3 feature extractors for compact (uint8 / bit-packed) observations
+
+import gymnasium as gym
+import numpy as np
+import torch
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+class BinaryObsExtractor(BaseFeaturesExtractor):
+    """
+    Flattens uint8 or bit-packed binary observations and casts them to float only here,
+    at the policy input, so env, VecEnv and rollout buffer all keep the compact dtype.
+    Packed bytes are unpacked with shifts (np.packbits bit order); the trailing pad
+    bits of the last byte are always 0 and are simply kept as inputs.
+    """
+
+    def __init__(self, observation_space: gym.spaces.Box, packed: bool = False):
+        n = int(np.prod(observation_space.shape))
+        super().__init__(observation_space, features_dim=n * 8 if packed else n)
+        self.packed = packed
+        self.register_buffer("_shifts", torch.arange(7, -1, -1, dtype=torch.uint8), persistent=False)
+
+    def forward(self, observations: torch.Tensor) -> torch.Tensor:
+        x = observations.flatten(1)
+        if self.packed:
+            x = ((x.to(torch.uint8).unsqueeze(-1) >> self._shifts) & 1).flatten(1)
+        return x.float()
+
+def binary_obs_policy_kwargs(obs_dtype: str) -> dict:
+    """policy_kwargs for PPO("MlpPolicy", ...) matching an env created with `obs_dtype`."""
+    if obs_dtype == "float32":
+        return {}
+    return dict(features_extractor_class=BinaryObsExtractor,
+                features_extractor_kwargs=dict(packed=obs_dtype == "packed"))
@@ -0,0 +1,121 @@
+# Static grid maps (walls, one-way streets) compiled once into arrays used by the envs
+
+import os
+from typing import Optional
+
+import numpy as np
+
+STAY, UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3, 4
+# (dx, dy) per movement action, cells are (x, y) and grids are indexed [y, x]
+MOVE_DELTAS = np.array([(0, 0), (0, -1), (0, 1), (-1, 0), (1, 0)], dtype=np.int64)
+
+# ASCII maps: walls, free cells, and one-way street cells that can't be left against the arrow
+WALL_CHARS = "#"
+ONE_WAY_CHARS = {"^": UP, "v": DOWN, "<": LEFT, ">": RIGHT}
+OPPOSITE = {UP: DOWN, DOWN: UP, LEFT: RIGHT, RIGHT: LEFT}
+
+def moves_from_free(free: np.ndarray) -> np.ndarray:
+    """valid_moves bool[G, G, 5] ([y, x, action]) from a walkable-cell mask bool[G, G]: moves into walls/off the map are invalid."""
+    free = np.asarray(free, dtype=bool)
+    padded = np.pad(free, 1, constant_values=False)
+    G = free.shape[0]
+    valid = np.zeros((G, G, 5), dtype=bool)
+    valid[..., STAY] = free
+    for a in (UP, DOWN, LEFT, RIGHT):
+        dx, dy = MOVE_DELTAS[a]
+        valid[..., a] = free & padded[1 + dy:1 + dy + G, 1 + dx:1 + dx + G]
+    return valid
+
+def open_grid_moves(grid_size: int) -> np.ndarray:
+    """valid_moves for an empty grid: every move except off the border (the env's original clamping)."""
+    return moves_from_free(np.ones((grid_size, grid_size), dtype=bool))
+
+class GridMap:
+    """
+    A static square layout, compiled once into:
+      free          bool[G, G]       walkable cells ([y, x])
+      valid_moves   bool[G, G, 5]    allowed STAY/UP/DOWN/LEFT/RIGHT per cell
+      free_cells    int16[K, 2]      walkable (x, y) cells, for O(1) spawn sampling
+      static_layer  float32[G, G]    1.0 on walls, the env's static observation channel
+    """
+
+    def __init__(self, valid_moves: np.ndarray):
+        valid_moves = np.asarray(valid_moves, dtype=bool)
+        if valid_moves.ndim != 3 or valid_moves.shape[0] != valid_moves.shape[1] or valid_moves.shape[2] != 5:
+            raise ValueError(f"valid_moves must have shape (G, G, 5), got {valid_moves.shape}")
+        self.valid_moves = valid_moves
+        self.free = valid_moves[..., STAY].copy()
+        if not self.free.any():
+            raise ValueError("Map has no free cells")
+        self.grid_size = self.free.shape[0]
+        self.free_cells = np.argwhere(self.free)[:, ::-1].astype(np.int16)
+        self.static_layer = (~self.free).astype(np.float32)
+        for arr in (self.valid_moves, self.free, self.free_cells, self.static_layer):
+            arr.flags.writeable = False
+
+    # ----- constructors -----
+    @classmethod
+    def from_array(cls, occupancy) -> "GridMap":
+        """Occupancy grid [y, x]: nonzero cells are walls."""
+        occupancy = np.asarray(occupancy)
+        if occupancy.ndim != 2 or occupancy.shape[0] != occupancy.shape[1]:
+            raise ValueError(f"Occupancy grid must be square, got shape {occupancy.shape}")
+        return cls(moves_from_free(occupancy == 0))
+
+    @classmethod
+    def from_ascii(cls, text: str) -> "GridMap":
+        """One line per row: '#' wall, any other char free; '^', 'v', '<', '>' are one-way street cells."""
+        rows = [line for line in text.strip("\n").splitlines()]
+        G = len(rows)
+        if any(len(row) != G for row in rows):
+            raise ValueError(f"ASCII map must be square, got {G} rows of widths {sorted({len(r) for r in rows})}")
+        chars = np.array([list(row) for row in rows])
+        valid = moves_from_free(~np.isin(chars, list(WALL_CHARS)))
+        for ch, action in ONE_WAY_CHARS.items():
+            valid[chars == ch, OPPOSITE[action]] = False
+        return cls(valid)
+
+    @classmethod
+    def from_graph(cls, graph, grid_size: Optional[int] = None) -> "GridMap":
+        """
+        networkx graph whose nodes are (x, y) cells and whose edges join 4-neighbours.
+        Undirected edges are two-way streets, DiGraph edges are one-way. Missing cells are walls.
+        """
+        nodes = list(graph.nodes)
+        G = grid_size if grid_size is not None else 1 + max(max(x, y) for x, y in nodes)
+        valid = np.zeros((G, G, 5), dtype=bool)
+        for x, y in nodes:
+            valid[y, x, STAY] = True
+        step_action = {tuple(d): a for a, d in enumerate(MOVE_DELTAS.tolist()) if a != STAY}
+        edges = list(graph.edges)
+        if not graph.is_directed():
+            edges += [(v, u) for u, v in edges]
+        for (x0, y0), (x1, y1) in edges:
+            action = step_action.get((x1 - x0, y1 - y0))
+            if action is None:
+                raise ValueError(f"Edge {(x0, y0)} -> {(x1, y1)} does not join neighbouring cells")
+            valid[y0, x0, action] = True
+        return cls(valid)
+
+    @classmethod
+    def load(cls, path: str) -> "GridMap":
+        """`.npy` occupancy grid or a text file in the ASCII format."""
+        if os.path.splitext(path)[1] == ".npy":
+            return cls.from_array(np.load(path))
+        with open(path) as f:
+            return cls.from_ascii(f.read())
+
+    def to_ascii(self) -> str:
+        return "\n".join("".join("." if c else "#" for c in row) for row in self.free)
+
+def as_grid_map(spec) -> GridMap:
+    """Accept a GridMap, an occupancy array, a networkx graph, ASCII text or a map file path."""
+    if isinstance(spec, GridMap):
+        return spec
+    if isinstance(spec, np.ndarray):
+        return GridMap.from_array(spec)
+    if isinstance(spec, str):
+        return GridMap.from_ascii(spec) if "\n" in spec else GridMap.load(spec)
+    if hasattr(spec, "nodes") and hasattr(spec, "edges"):
+        return GridMap.from_graph(spec)
+    return GridMap.from_array(np.asarray(spec))
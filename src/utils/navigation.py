@@ -0,0 +1,164 @@
+# Grid navigation: precomputed next-hop / shortest-path tables, cached on disk per layout
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from utils.grid_map import UP, DOWN, LEFT, RIGHT, MOVE_DELTAS, open_grid_moves
+
+# Among equally short moves: x axis first, then y (same order as policies/heuristics_greedy_approach.py)
+HOP_PRIORITY = (RIGHT, LEFT, DOWN, UP)
+
+UNREACHABLE = np.iinfo(np.uint16).max
+DEFAULT_CACHE_DIR = os.path.join("data", "nav_cache")
+_FORMAT_VERSION = 1
+
+def layout_hash(valid_moves: np.ndarray) -> str:
+    valid_moves = np.asarray(valid_moves, dtype=bool)
+    h = hashlib.sha1(f"v{_FORMAT_VERSION}:{valid_moves.shape}".encode())
+    h.update(np.packbits(valid_moves).tobytes())
+    return h.hexdigest()[:16]
+
+class Navigator:
+    """
+    O(1) next-move lookups for one grid layout, described by `valid_moves` bool[G, G, 5]
+    ([y, x, action]; may be asymmetric for one-way streets).
+
+    Grids with at most `max_table_cells` cells get a full next-hop table uint8[N, N] and a
+    distance table uint16[N, N] (N = G*G, cell index y*G + x), written once to
+    `<cache_dir>/<layout hash>.{next_hop,dist}.npy` and memory-mapped on later starts.
+    Larger grids compute one BFS field per target on demand and keep the most recent
+    `max_fields` of them in memory.
+    Unreachable targets get STAY and distance UNREACHABLE.
+    """
+
+    def __init__(self, valid_moves: np.ndarray, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_table_cells: int = 4096, max_fields: int = 4096):
+        self.valid_moves = np.ascontiguousarray(valid_moves, dtype=bool)
+        self.grid_size = self.valid_moves.shape[0]
+        self.num_cells = self.grid_size * self.grid_size
+        self.key = layout_hash(self.valid_moves)
+        self.max_fields = max_fields
+
+        # neighbor[s, a]: cell reached from s with action a (s itself when the move is invalid)
+        G = self.grid_size
+        ys, xs = np.divmod(np.arange(self.num_cells), G)
+        valid = self.valid_moves.reshape(self.num_cells, 5)
+        nx = np.clip(xs[:, None] + MOVE_DELTAS[None, :, 0], 0, G - 1)
+        ny = np.clip(ys[:, None] + MOVE_DELTAS[None, :, 1], 0, G - 1)
+        self.neighbor = np.where(valid, ny * G + nx, np.arange(self.num_cells)[:, None])
+        src, act = np.nonzero(valid[:, 1:])
+        self._graph = csr_matrix(
+            (np.ones(len(src)), (src, self.neighbor[src, act + 1])), shape=(self.num_cells, self.num_cells)
+        )
+        self._reverse_graph = self._graph.T.tocsr()
+
+        self.next_hop: Optional[np.ndarray] = None
+        self.dist: Optional[np.ndarray] = None
+        self._fields: "OrderedDict[int, tuple]" = OrderedDict()
+        if self.num_cells <= max_table_cells:
+            self._load_or_build_table(cache_dir)
+
+    # ----- construction -----
+    def _hops_from_dist(self, dist_to: np.ndarray, src: np.ndarray) -> np.ndarray:
+        """dist_to float[N, T] (distance of every cell to T targets) -> uint8[len(src), T] first moves."""
+        d = dist_to[src]
+        hops = np.zeros(d.shape, dtype=np.uint8)
+        chosen = ~np.isfinite(d) | (d == 0)
+        for a in HOP_PRIORITY:
+            take = ~chosen & (dist_to[self.neighbor[src, a]] == d - 1)
+            hops[take] = a
+            chosen |= take
+        return hops
+
+    def _build_table(self):
+        dist = shortest_path(self._graph, method="D", unweighted=True)     # float64[src, dst]
+        hops = np.empty((self.num_cells, self.num_cells), dtype=np.uint8)
+        block = max(1, (1 << 22) // self.num_cells)
+        for start in range(0, self.num_cells, block):
+            hops[start:start + block] = self._hops_from_dist(dist, np.arange(start, min(start + block, self.num_cells)))
+        self.next_hop = hops
+        self.dist = np.where(np.isfinite(dist), dist, UNREACHABLE).astype(np.uint16)
+
+    def _load_or_build_table(self, cache_dir: Optional[str]):
+        paths = None
+        if cache_dir:
+            paths = [os.path.join(cache_dir, f"{self.key}.{name}.npy") for name in ("next_hop", "dist")]
+            if all(os.path.exists(p) for p in paths):
+                self.next_hop, self.dist = (np.load(p, mmap_mode="r") for p in paths)
+                return
+        self._build_table()
+        if paths:
+            os.makedirs(cache_dir, exist_ok=True)
+            for path, arr in zip(paths, (self.next_hop, self.dist)):
+                tmp = path + f".{os.getpid()}.tmp.npy"
+                np.save(tmp, arr)
+                os.replace(tmp, path)   # atomic, so concurrent workers never read a half-written table
+
+    def _field(self, target: int):
+        """(next_hop uint8[N], dist uint16[N]) towards one target, LRU-cached."""
+        field = self._fields.get(target)
+        if field is not None:
+            self._fields.move_to_end(target)
+            return field
+        # distances *to* the target: BFS from it on the reversed graph
+        dist = shortest_path(self._reverse_graph, method="D", unweighted=True, indices=target)
+        hops = self._hops_from_dist(dist[:, None], np.arange(self.num_cells))[:, 0]
+        field = (hops, np.where(np.isfinite(dist), dist, UNREACHABLE).astype(np.uint16))
+        self._fields[target] = field
+        if len(self._fields) > self.max_fields:
+            self._fields.popitem(last=False)
+        return field
+
+    # ----- lookups -----
+    def cell_index(self, cells) -> np.ndarray:
+        cells = np.asarray(cells, dtype=np.int64)
+        return cells[..., 1] * self.grid_size + cells[..., 0]
+
+    def _lookup(self, which: int, src, dst) -> np.ndarray:
+        s, d = np.broadcast_arrays(self.cell_index(src), self.cell_index(dst))
+        if self.next_hop is not None:
+            table = self.next_hop if which == 0 else self.dist
+            return np.asarray(table[s, d])
+        out = np.empty(s.shape, dtype=np.uint8 if which == 0 else np.uint16)
+        for target in np.unique(d):
+            sel = d == target
+            out[sel] = self._field(int(target))[which][s[sel]]
+        return out
+
+    def next_hops(self, src, dst) -> np.ndarray:
+        """First move of a shortest path, elementwise over broadcastable [..., 2] (x, y) arrays."""
+        return self._lookup(0, src, dst)
+
+    def distances(self, src, dst) -> np.ndarray:
+        """Shortest-path lengths, elementwise over broadcastable [..., 2] (x, y) arrays."""
+        return self._lookup(1, src, dst)
+
+    def next_hop_cell(self, src, dst) -> int:
+        """Scalar version of `next_hops` for a single (x, y) pair."""
+        s = src[1] * self.grid_size + src[0]
+        d = dst[1] * self.grid_size + dst[0]
+        if self.next_hop is not None:
+            return int(self.next_hop[s, d])
+        return int(self._field(d)[0][s])
+
+# One Navigator per layout and process, shared by every policy that asks for it
+_NAVIGATORS: Dict[str, Navigator] = {}
+
+def get_navigator(valid_moves: np.ndarray, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, **kwargs) -> Navigator:
+    key = layout_hash(valid_moves)
+    if key not in _NAVIGATORS:
+        _NAVIGATORS[key] = Navigator(valid_moves, cache_dir=cache_dir, **kwargs)
+    return _NAVIGATORS[key]
+
+def navigator_for(env, **kwargs) -> Navigator:
+    """Navigator for an env's layout (`env.valid_moves` when it has one, otherwise an open grid)."""
+    valid_moves = getattr(env, "valid_moves", None)
+    if valid_moves is None:
+        valid_moves = open_grid_moves(env.grid_size)
+    return get_navigator(valid_moves, **kwargs)
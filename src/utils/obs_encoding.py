@@ -0,0 +1,29 @@
+# compact encodings for the binary grid observations: float32, uint8 or bit-packed uint8
+
+import numpy as np
+from gymnasium import spaces
+
+OBS_DTYPES = ("float32", "uint8", "packed")
+
+def packed_size(shape) -> int:
+    """Bytes per observation of `shape` once bit-packed."""
+    return (int(np.prod(shape)) + 7) // 8
+
+def obs_space(shape, obs_dtype="float32") -> spaces.Box:
+    """Box for a binary observation of `shape` in the given encoding (packed obs are flat byte vectors)."""
+    if obs_dtype == "float32":
+        return spaces.Box(low=0, high=1, shape=shape, dtype=np.float32)
+    if obs_dtype == "uint8":
+        return spaces.Box(low=0, high=1, shape=shape, dtype=np.uint8)
+    if obs_dtype == "packed":
+        return spaces.Box(low=0, high=255, shape=(packed_size(shape),), dtype=np.uint8)
+    raise ValueError(f"Unknown obs_dtype {obs_dtype!r} (expected one of {OBS_DTYPES})")
+
+def pack_obs(obs: np.ndarray) -> np.ndarray:
+    """[N, ...] binary uint8/bool -> [N, packed_size] uint8 (np.packbits, big-endian bit order)."""
+    return np.packbits(obs.reshape(len(obs), -1), axis=1)
+
+def unpack_obs(packed: np.ndarray, shape) -> np.ndarray:
+    """[..., packed_size] uint8 -> [..., *shape] uint8 with values 0/1."""
+    bits = np.unpackbits(packed, axis=-1, count=int(np.prod(shape)))
+    return bits.reshape(*packed.shape[:-1], *shape)
@@ -0,0 +1,103 @@
+# low-overhead phase timers for the env / wrapper / policy / replay hot paths
+
+import atexit
+import functools
+import os
+import sys
+import time
+from collections import defaultdict
+
+ENV_VAR = "DELIVERY_PROFILE"
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler, self.name = profiler, name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Per-phase wall time and call counts (inclusive: env.step contains env.actions etc.).
+
+    Hot paths are instrumented with the `timed` decorator, which costs nothing while
+    profiling is off. Env steps are the calls of the "env.step" phase.
+    Timers are per process: with subprocess/shm VecEnvs the env phases are measured
+    in the workers, profile env phases with the in-process (dummy) backend.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.start = time.perf_counter()
+
+    def add(self, name, seconds):
+        self.totals[name] += seconds
+        self.calls[name] += 1
+
+    def summary(self):
+        """Wall time, env steps/s and, per phase, total seconds, calls, mean us and share of wall time."""
+        wall = time.perf_counter() - self.start
+        steps = self.calls.get("env.step", 0)
+        return {
+            "wall_s": wall,
+            "env_steps": steps,
+            "steps_per_sec": steps / wall if wall > 0 else 0.0,
+            "phases": {
+                name: {
+                    "total_s": total,
+                    "calls": self.calls[name],
+                    "mean_us": 1e6 * total / self.calls[name],
+                    "share": total / wall if wall > 0 else 0.0,
+                }
+                for name, total in sorted(self.totals.items(), key=lambda kv: -kv[1])
+            },
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        lines = [f"profile: {s['env_steps']} env steps in {s['wall_s']:.2f}s ({s['steps_per_sec']:,.0f} steps/s)",
+                 f"{'phase':<18} {'total s':>9} {'calls':>10} {'mean us':>9} {'share':>7}"]
+        for name, p in s["phases"].items():
+            lines.append(f"{name:<18} {p['total_s']:>9.3f} {p['calls']:>10} {p['mean_us']:>9.1f} {p['share']:>7.1%}")
+        return "\n".join(lines)
+
+
+# Process-wide profiler, switched on with DELIVERY_PROFILE=1 (no code changes needed)
+PROFILER = Profiler(enabled=os.environ.get(ENV_VAR, "0") not in ("", "0"))
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as phase `name`. The switch is read when the
+    function is defined: with profiling off the function is returned unwrapped, so hot
+    paths pay nothing. Set DELIVERY_PROFILE before the instrumented modules are imported.
+    """
+    def decorator(fn):
+        if not PROFILER.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(PROFILER, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@atexit.register
+def _print_summary():
+    if PROFILER.enabled and PROFILER.totals:
+        print(PROFILER.format_summary(), file=sys.stderr)
@@ -0,0 +1,69 @@
+# SB3 callback exporting utils.profiling phase timers to the training logger (TensorBoard)
+
+import time
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+from utils.profiling import PROFILER
+
+
+class ProfilingCallback(BaseCallback):
+    """
+    With profiling on (DELIVERY_PROFILE=1), times each rollout ("ppo.rollout": env steps plus
+    policy inference) and each update ("ppo.train"), and after every rollout records under
+    profile/: env steps/s, each phase's share of the rollout wall time and mean us per call,
+    and sb3_other_share, the rollout time not spent in env/wrapper phases (mostly inference).
+    The values land in the run's TensorBoard log next to rollout/ and train/. Does nothing
+    while profiling is off.
+    """
+
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self._rollout_start = None
+        self._train_start = None
+        self._last_totals = {}
+        self._last_calls = {}
+        self._last_steps = 0
+
+    def _on_rollout_start(self):
+        if not PROFILER.enabled:
+            return
+        now = time.perf_counter()
+        if self._train_start is not None:
+            PROFILER.add("ppo.train", now - self._train_start)
+        self._rollout_start = now
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self):
+        if not PROFILER.enabled or self._rollout_start is None:
+            return
+        now = time.perf_counter()
+        wall = now - self._rollout_start
+        PROFILER.add("ppo.rollout", wall)
+        self._train_start = now
+
+        steps = PROFILER.calls.get("env.step", 0)
+        if steps > self._last_steps:
+            self.logger.record("profile/env_steps_per_sec", (steps - self._last_steps) / wall)
+        measured = 0.0
+        for name, total in PROFILER.totals.items():
+            calls = PROFILER.calls[name] - self._last_calls.get(name, 0)
+            if calls == 0 or name.startswith("ppo."):
+                continue
+            spent = total - self._last_totals.get(name, 0.0)
+            self.logger.record(f"profile/{name}_share", spent / wall)
+            self.logger.record(f"profile/{name}_us", 1e6 * spent / calls)
+            if name in ("env.step", "env.reset") or name.startswith("wrapper."):
+                measured += spent
+        # the rest of the rollout: policy inference, rollout buffer, VecEnv plumbing
+        self.logger.record("profile/sb3_other_share", 1.0 - measured / wall)
+        self._last_totals = dict(PROFILER.totals)
+        self._last_calls = dict(PROFILER.calls)
+        self._last_steps = steps
+
+    def _on_training_end(self):
+        if PROFILER.enabled and self._train_start is not None:
+            PROFILER.add("ppo.train", time.perf_counter() - self._train_start)
+            self._train_start = None
@@ -2,56 +2,210 @@
 
 from __future__ import annotations
 import numpy as np
-from collections import deque
-from typing import Dict, Any, Tuple, Deque
+from typing import Dict, Optional, Tuple
+
+from utils.profiling import timed
+from utils.replay_dataset import ReplayDatasetWriter, store_exact
+
+
+class AgentRing:
+    """
+    Preallocated ring of one agent's transitions:
+      obs[capacity, C, G, G] (obs_dtype), actions int64, rewards float32, dones bool.
+    next_obs is not stored: it is obs at the next slot, except for the newest
+    transition and for rows flagged `done` or `boundary` (an episode cut without
+    `done`, e.g. at a step limit), whose successors are kept on the side.
+    """
+
+    def __init__(self, capacity: int, obs_shape: Tuple[int, ...], obs_dtype):
+        self.capacity = capacity
+        self.obs = np.zeros((capacity, *obs_shape), dtype=obs_dtype)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.last_next_obs = np.zeros(obs_shape, dtype=obs_dtype)
+        self.terminal_next_obs: Dict[int, np.ndarray] = {}
+        self.has_terminal = np.zeros(capacity, dtype=np.bool_)
+        self.head = 0
+        self.size = 0
+
+    @classmethod
+    def from_arrays(cls, capacity: int, obs, actions, rewards, dones) -> "AgentRing":
+        """Build a ring holding `len(obs)` transitions in slots [0, n); a full ring adopts the arrays as storage."""
+        n = len(obs)
+        if n == capacity:
+            ring = cls(0, obs.shape[1:], obs.dtype)
+            ring.capacity = capacity
+            ring.obs, ring.actions, ring.rewards, ring.dones = obs, actions, rewards, dones
+            ring.has_terminal = np.zeros(capacity, dtype=np.bool_)
+        else:
+            ring = cls(capacity, obs.shape[1:], obs.dtype)
+            ring.obs[:n], ring.actions[:n], ring.rewards[:n], ring.dones[:n] = obs, actions, rewards, dones
+        ring.size = n
+        return ring
+
+    def _set_terminal(self, i: int, next_obs):
+        self.terminal_next_obs[i] = np.array(next_obs, dtype=self.obs.dtype)
+        self.has_terminal[i] = True
+
+    def append(self, obs, action: int, reward: float, next_obs, done: bool, boundary: bool = False):
+        i = self.head
+        store_exact(self.obs[i], obs)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        store_exact(self.last_next_obs, next_obs)
+        self.terminal_next_obs.pop(i, None)
+        self.has_terminal[i] = False
+        if done or boundary:
+            self._set_terminal(i, self.last_next_obs)
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def chronological(self) -> np.ndarray:
+        """Slot indices from oldest to newest."""
+        return (self.head - self.size + np.arange(self.size)) % self.capacity
+
+    def next_obs(self, idx: np.ndarray) -> np.ndarray:
+        nxt = self.obs[(idx + 1) % self.capacity]
+        nxt[idx == (self.head - 1) % self.capacity] = self.last_next_obs
+        for j in np.flatnonzero(self.has_terminal[idx]):
+            nxt[j] = self.terminal_next_obs[int(idx[j])]
+        return nxt
+
+    def clear(self):
+        self.terminal_next_obs.clear()
+        self.has_terminal[:] = False
+        self.head = 0
+        self.size = 0
+
 
 class PerAgentReplayBuffer:
     """
     Stores per-agent transitions:
       (obs, action, reward, next_obs, done)
-    Obs and next_obs are stored as np.float32 arrays.
+    in one preallocated AgentRing per agent. Obs are stored as `obs_dtype`, by
+    default the dtype of the first obs added (run the env with obs_dtype="uint8" for
+    compact grid obs). An obs that isn't exactly representable in `obs_dtype` raises
+    ValueError. Bit-packed env observations (obs_dtype="packed") are stored as the
+    packed bytes as-is; expand sampled batches with utils.obs_encoding.unpack_obs.
+
+    With `stream_dir`, every transition is also appended to a chunked on-disk
+    dataset (see utils/replay_dataset.py); `capacity=0` then keeps nothing in RAM.
+    Call `close()` when done to flush the last chunks and write the index.
     """
 
-    def __init__(self, capacity: int = 100_000):
+    def __init__(self, capacity: int = 100_000, obs_dtype=None, seed: Optional[int] = None,
+                 stream_dir: Optional[str] = None, chunk_size: int = 65_536):
         self.capacity = capacity
-        self.data: Dict[str, Deque[Tuple[np.ndarray, int, float, np.ndarray, bool]]] = {}
+        self.obs_dtype = obs_dtype
+        self.data: Dict[str, AgentRing] = {}
+        self._rng = np.random.default_rng(seed)
+        self.writer = ReplayDatasetWriter(stream_dir, chunk_size, obs_dtype) if stream_dir else None
 
-    def _ensure_agent(self, agent_id: str):
+    def _ensure_agent(self, agent_id: str, obs: np.ndarray):
         if agent_id not in self.data:
-            self.data[agent_id] = deque(maxlen=self.capacity)
-            
+            if self.obs_dtype is None:
+                self.obs_dtype = obs.dtype
+            self.data[agent_id] = AgentRing(self.capacity, obs.shape, self.obs_dtype)
+
+    @timed("replay.append")
     def add_step(self,
                  obs: Dict[str, np.ndarray],
                  actions: Dict[str, int],
                  rewards: Dict[str, float],
                  next_obs: Dict[str, np.ndarray],
-                 dones: Dict[str, bool]):
+                 dones: Dict[str, bool],
+                 boundaries: Optional[Dict[str, bool]] = None):
+        """`boundaries` flags agents whose episode is cut after this step without being done."""
+        boundaries = boundaries or {}
+        if self.writer is not None:
+            self.writer.add_step(obs, actions, rewards, next_obs, dones, boundaries)
+        if self.capacity == 0:
+            return
         for a in actions.keys():
-            self._ensure_agent(a)
-            o = np.asarray(obs[a], dtype=np.float32)
-            n = np.asarray(next_obs[a], dtype=np.float32)
-            r = float(rewards.get(a, 0.0))
-            d = bool(dones.get(a, False))
-            u = int(actions[a])
-            self.data[a].append((o, u, r, n, d))
-            
+            self._ensure_agent(a, np.asarray(obs[a]))
+            self.data[a].append(obs[a], int(actions[a]), float(rewards.get(a, 0.0)),
+                                next_obs[a], bool(dones.get(a, False)), bool(boundaries.get(a, False)))
+
     def size(self) -> int:
-        return sum(len(v) for v in self.data.values())
+        return sum(ring.size for ring in self.data.values())
+
+    def sample(self, batch_size: int, agent_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Uniformly sample `batch_size` transitions (from one agent, or from all agents pooled)."""
+        agents = [agent_id] if agent_id is not None else [a for a, ring in self.data.items() if ring.size]
+        sizes = np.array([self.data[a].size for a in agents], dtype=np.float64)
+        if sizes.sum() == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+        counts = self._rng.multinomial(batch_size, sizes / sizes.sum())
+
+        parts = []
+        for a, n in zip(agents, counts):
+            if n == 0:
+                continue
+            ring = self.data[a]
+            idx = (ring.head - ring.size + self._rng.integers(0, ring.size, size=n)) % ring.capacity
+            parts.append((ring.obs[idx], ring.actions[idx], ring.rewards[idx], ring.next_obs(idx), ring.dones[idx]))
+        O, A, R, N, D = (np.concatenate(col) for col in zip(*parts))
+        return {"obs": O, "actions": A, "rewards": R, "next_obs": N, "dones": D}
+
+    def save(self, path: str):
+        """Write the raw ring storage (uncompressed, no restacking); read back with `load`."""
+        npz_dict = {"capacity": np.int64(self.capacity)}
+        for a, ring in self.data.items():
+            n = ring.size
+            npz_dict[f"{a}/obs"] = ring.obs[:n]
+            npz_dict[f"{a}/actions"] = ring.actions[:n]
+            npz_dict[f"{a}/rewards"] = ring.rewards[:n]
+            npz_dict[f"{a}/dones"] = ring.dones[:n]
+            npz_dict[f"{a}/head"] = np.int64(ring.head)
+            npz_dict[f"{a}/last_next_obs"] = ring.last_next_obs
+            ends = np.array(sorted(ring.terminal_next_obs), dtype=np.int64)
+            npz_dict[f"{a}/terminal_idx"] = ends
+            npz_dict[f"{a}/terminal_next_obs"] = (
+                np.stack([ring.terminal_next_obs[i] for i in ends]) if len(ends)
+                else np.zeros((0, *ring.obs.shape[1:]), dtype=ring.obs.dtype)
+            )
+        np.savez(path, **npz_dict)
+
+    @classmethod
+    def load(cls, path: str) -> "PerAgentReplayBuffer":
+        data = np.load(path)
+        capacity = int(data["capacity"])
+        agents = sorted({k.split("/")[0] for k in data.files if "/" in k})
+        rb = None
+        for a in agents:
+            obs = data[f"{a}/obs"]
+            if rb is None:
+                rb = cls(capacity=capacity, obs_dtype=obs.dtype)
+            ring = AgentRing.from_arrays(capacity, obs, data[f"{a}/actions"], data[f"{a}/rewards"], data[f"{a}/dones"])
+            ring.head = int(data[f"{a}/head"])
+            ring.last_next_obs = data[f"{a}/last_next_obs"]
+            ring.terminal_next_obs = dict(zip(data[f"{a}/terminal_idx"].tolist(), data[f"{a}/terminal_next_obs"]))
+            ring.has_terminal[data[f"{a}/terminal_idx"]] = True
+            rb.data[a] = ring
+        return rb if rb is not None else cls(capacity=capacity)
 
     def save_npz(self, path: str):
-        # flatten to arrays per agent
+        # export in the original chronological layout (agent_i/obs, agent_i/next_obs, ...)
         npz_dict = {}
-        for a, buf in self.data.items():
-            if not buf:
+        for a, ring in self.data.items():
+            if not ring.size:
                 continue
-            O, A, R, N, D = zip(*buf)
-            npz_dict[f"{a}/obs"] = np.stack(O, axis=0)
-            npz_dict[f"{a}/actions"] = np.asarray(A, dtype=np.int64)
-            npz_dict[f"{a}/rewards"] = np.asarray(R, dtype=np.float32)
-            npz_dict[f"{a}/next_obs"] = np.stack(N, axis=0)
-            npz_dict[f"{a}/dones"] = np.asarray(D, dtype=np.bool_)
+            idx = ring.chronological()
+            npz_dict[f"{a}/obs"] = ring.obs[idx]
+            npz_dict[f"{a}/actions"] = ring.actions[idx]
+            npz_dict[f"{a}/rewards"] = ring.rewards[idx]
+            npz_dict[f"{a}/next_obs"] = ring.next_obs(idx)
+            npz_dict[f"{a}/dones"] = ring.dones[idx]
         np.savez_compressed(path, **npz_dict)
 
     def clear(self):
         for a in list(self.data.keys()):
-            self.data[a].clear()
\ No newline at end of file
+            self.data[a].clear()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
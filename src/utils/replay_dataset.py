@@ -0,0 +1,339 @@
+# append-only, chunked, memory-mapped replay dataset on disk
+
+from __future__ import annotations
+import json
+import os
+import queue
+import shutil
+import threading
+import numpy as np
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+COLUMNS = ("obs", "actions", "rewards", "dones")
+BOUNDARY_COLUMNS = ("boundary_idx", "boundary_next_obs")
+
+# Layout:
+#   <root>/index.json                      obs shape/dtype, chunk size, rows per chunk for every agent
+#   <root>/<agent>/<chunk>.obs.npy         [n, *obs_shape]
+#   <root>/<agent>/<chunk>.actions.npy     int64 [n]
+#   <root>/<agent>/<chunk>.rewards.npy     float32 [n]
+#   <root>/<agent>/<chunk>.dones.npy       bool [n]
+#   <root>/<agent>/<chunk>.boundary_idx.npy / .boundary_next_obs.npy
+# next_obs of row i is obs of row i + 1, except at "boundaries" (episode ends, episodes cut
+# without done, and the last row written) whose successor frame is stored explicitly in the
+# row's chunk. Cuts are flagged by the caller (`boundary`).
+
+
+def _chunk_path(root: str, agent: str, chunk: int, column: str) -> str:
+    return os.path.join(root, agent, f"{chunk:05d}.{column}.npy")
+
+
+def store_exact(dst: np.ndarray, obs) -> None:
+    """
+    dst[...] = obs, raising ValueError if the cast to dst's dtype changed a value (e.g.
+    float entity features into uint8). Only casts NumPy doesn't consider safe are checked.
+    """
+    dst[...] = obs
+    obs = np.asarray(obs)
+    if not np.can_cast(obs.dtype, dst.dtype) and not np.array_equal(dst, obs):
+        raise ValueError(f"Observation of dtype {obs.dtype} is not exactly representable as {dst.dtype}; "
+                         f"pass obs_dtype=None to store it as is")
+
+
+def _write_index(root: str, obs_shape, obs_dtype, chunk_size: int, chunk_rows: Dict[str, List[int]]):
+    index = {
+        "version": FORMAT_VERSION,
+        "obs_shape": list(obs_shape or ()),
+        "obs_dtype": np.dtype(obs_dtype).str,
+        "chunk_size": chunk_size,
+        "agents": {a: {"chunk_rows": rows} for a, rows in chunk_rows.items()},
+    }
+    with open(os.path.join(root, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+
+
+class _AgentChunkWriter:
+    """Fills one preallocated chunk and flushes it to .npy files once its successor is known."""
+
+    def __init__(self, root: str, agent: str, chunk_size: int, obs_shape, obs_dtype):
+        self.root, self.agent, self.chunk_size = root, agent, chunk_size
+        os.makedirs(os.path.join(root, agent), exist_ok=True)
+        self.obs = np.zeros((chunk_size, *obs_shape), dtype=obs_dtype)
+        self.actions = np.zeros(chunk_size, dtype=np.int64)
+        self.rewards = np.zeros(chunk_size, dtype=np.float32)
+        self.dones = np.zeros(chunk_size, dtype=np.bool_)
+        self.last_next_obs = np.zeros(obs_shape, dtype=obs_dtype)
+        self.boundary_idx: List[int] = []
+        self.boundary_next_obs: List[np.ndarray] = []
+        self.n = 0
+        self.chunk_rows: List[int] = []
+
+    def append(self, obs, action, reward, next_obs, done, boundary=False):
+        if self.n == self.chunk_size:
+            # the previous row's successor is this row, so the full chunk can go to disk as-is
+            self._flush()
+        i = self.n
+        store_exact(self.obs[i], obs)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        store_exact(self.last_next_obs, next_obs)
+        if done or boundary:
+            self.boundary_idx.append(i)
+            self.boundary_next_obs.append(self.last_next_obs.copy())
+        self.n += 1
+
+    def close(self):
+        if self.n == 0:
+            return
+        if not (self.boundary_idx and self.boundary_idx[-1] == self.n - 1):
+            self.boundary_idx.append(self.n - 1)
+            self.boundary_next_obs.append(self.last_next_obs.copy())
+        self._flush()
+
+    def _flush(self):
+        chunk, n = len(self.chunk_rows), self.n
+        for column in COLUMNS:
+            np.save(_chunk_path(self.root, self.agent, chunk, column), getattr(self, column)[:n])
+        np.save(_chunk_path(self.root, self.agent, chunk, "boundary_idx"), np.asarray(self.boundary_idx, dtype=np.int64))
+        np.save(
+            _chunk_path(self.root, self.agent, chunk, "boundary_next_obs"),
+            np.stack(self.boundary_next_obs) if self.boundary_next_obs
+            else np.zeros((0, *self.obs.shape[1:]), dtype=self.obs.dtype),
+        )
+        self.chunk_rows.append(n)
+        self.boundary_idx, self.boundary_next_obs = [], []
+        self.n = 0
+
+
+class ReplayDatasetWriter:
+    """
+    Streams per-agent transitions into a chunked dataset directory.
+    Memory use is one chunk per agent regardless of how much is written.
+    Obs are stored in the first obs's dtype unless `obs_dtype` is given; values that
+    don't fit that dtype exactly raise ValueError instead of being truncated.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 65_536, obs_dtype=None):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.obs_dtype = np.dtype(obs_dtype) if obs_dtype is not None else None
+        self.obs_shape: Optional[Tuple[int, ...]] = None
+        self._agents: Dict[str, _AgentChunkWriter] = {}
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, agent: str, obs, action: int, reward: float, next_obs, done: bool, boundary: bool = False):
+        """`boundary` marks a row whose next_obs is not the next row's obs even though it isn't done."""
+        if agent not in self._agents:
+            self.obs_shape = tuple(np.shape(obs))
+            if self.obs_dtype is None:
+                self.obs_dtype = np.asarray(obs).dtype
+            self._agents[agent] = _AgentChunkWriter(self.root, agent, self.chunk_size, self.obs_shape, self.obs_dtype)
+        self._agents[agent].append(obs, action, reward, next_obs, done, boundary)
+
+    def add_step(self, obs, actions, rewards, next_obs, dones, boundaries=None):
+        """Same dict-of-agents signature as PerAgentReplayBuffer.add_step."""
+        boundaries = boundaries or {}
+        for a in actions.keys():
+            self.append(a, obs[a], int(actions[a]), float(rewards.get(a, 0.0)), next_obs[a],
+                        bool(dones.get(a, False)), bool(boundaries.get(a, False)))
+
+    def close(self):
+        for w in self._agents.values():
+            w.close()
+        _write_index(self.root, self.obs_shape, self.obs_dtype or np.float32, self.chunk_size,
+                     {a: w.chunk_rows for a, w in self._agents.items()})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayDataset:
+    """
+    Read side of the chunked format. Chunks are opened lazily with np.load(mmap_mode="r"),
+    so datasets larger than RAM can be inspected and minibatch-sampled.
+    """
+
+    def __init__(self, root: str, seed: Optional[int] = None):
+        self.root = root
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.obs_shape = tuple(self.index["obs_shape"])
+        self.obs_dtype = np.dtype(self.index["obs_dtype"])
+        self.agents = sorted(self.index["agents"])
+        self._rows = {a: np.asarray(self.index["agents"][a]["chunk_rows"], dtype=np.int64) for a in self.agents}
+        self._offsets = {a: np.concatenate([[0], np.cumsum(r)]) for a, r in self._rows.items()}
+        self._cache: Dict[Tuple[str, int, str], np.ndarray] = {}
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return int(sum(self.num_transitions(a) for a in self.agents))
+
+    def num_transitions(self, agent: str) -> int:
+        return int(self._offsets[agent][-1])
+
+    def num_chunks(self, agent: str) -> int:
+        return len(self._rows[agent])
+
+    def column(self, agent: str, chunk: int, name: str) -> np.ndarray:
+        """Memory-mapped column of one chunk."""
+        key = (agent, chunk, name)
+        if key not in self._cache:
+            self._cache[key] = np.load(_chunk_path(self.root, agent, chunk, name), mmap_mode="r")
+        return self._cache[key]
+
+    def read_chunk(self, agent: str, chunk: int, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Load (a subset of rows of) one chunk, with next_obs reconstructed."""
+        n = int(self._rows[agent][chunk])
+        rows = np.arange(n) if rows is None else np.asarray(rows)
+        out = {name: np.asarray(self.column(agent, chunk, name)[rows]) for name in COLUMNS}
+
+        next_obs = np.asarray(self.column(agent, chunk, "obs")[np.minimum(rows + 1, n - 1)])
+        bidx = np.asarray(self.column(agent, chunk, "boundary_idx"))
+        pos = np.minimum(np.searchsorted(bidx, rows), max(len(bidx) - 1, 0))
+        hit = bidx[pos] == rows if len(bidx) else np.zeros(len(rows), dtype=bool)
+        if hit.any():
+            next_obs[hit] = self.column(agent, chunk, "boundary_next_obs")[pos[hit]]
+        spill = (rows == n - 1) & ~hit
+        if spill.any():
+            # successor of a chunk's last row is the first row of the next chunk
+            next_obs[spill] = self.column(agent, chunk + 1, "obs")[0]
+        out["next_obs"] = next_obs
+        return out
+
+    def sample(self, batch_size: int, agent: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Uniformly sample transitions, touching only the chunks that were drawn."""
+        agents = [agent] if agent is not None else self.agents
+        sizes = np.array([self.num_transitions(a) for a in agents], dtype=np.float64)
+        counts = self._rng.multinomial(batch_size, sizes / sizes.sum())
+        parts = []
+        for a, n in zip(agents, counts):
+            if n == 0:
+                continue
+            flat = np.sort(self._rng.integers(0, self.num_transitions(a), size=n))
+            chunks = np.searchsorted(self._offsets[a], flat, side="right") - 1
+            for c in np.unique(chunks):
+                parts.append(self.read_chunk(a, int(c), flat[chunks == c] - self._offsets[a][c]))
+        return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    def iter_batches(self, batch_size: int, shuffle: bool = True,
+                     agent: Optional[str] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """One pass over the data (one agent's, or all agents'): chunks in random order, rows shuffled within each chunk."""
+        agents = [agent] if agent is not None else self.agents
+        jobs = [(a, c) for a in agents for c in range(self.num_chunks(a))]
+        if shuffle:
+            self._rng.shuffle(jobs)
+        for a, c in jobs:
+            data = self.read_chunk(a, c)
+            n = len(data["actions"])
+            order = self._rng.permutation(n) if shuffle else np.arange(n)
+            for s in range(0, n, batch_size):
+                sel = order[s:s + batch_size]
+                yield {k: v[sel] for k, v in data.items()}
+
+
+def prefetch(batches: Iterable, depth: int = 4, transform: Optional[Callable] = None) -> Iterator:
+    """
+    Iterate `batches` on a background thread, keeping up to `depth` items (optionally passed
+    through `transform`, e.g. a torch conversion) ready, so chunk reads overlap the consumer.
+    Exceptions raised while producing are re-raised in the consumer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for batch in batches:
+                item = transform(batch) if transform is not None else batch
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            q.put(done)
+        except BaseException as e:  # hand the error to the consumer
+            q.put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join(timeout=1.0)
+
+
+def convert_npz(npz_path: str, root: str, chunk_size: int = 65_536, obs_dtype=None) -> ReplayDataset:
+    """
+    Convert a legacy `save_npz` file (agent_i/obs, agent_i/actions, agent_i/rewards,
+    agent_i/next_obs, agent_i/dones) into the chunked format, one agent at a time.
+    `obs_dtype=None` keeps the stored observation dtype.
+    """
+    data = np.load(npz_path, allow_pickle=False)
+    agents = sorted({k.split("/")[0] for k in data.files})
+    writer = None
+    for a in agents:
+        obs = data[f"{a}/obs"]
+        if writer is None:
+            writer = ReplayDatasetWriter(root, chunk_size=chunk_size, obs_dtype=obs_dtype or obs.dtype)
+        actions, rewards = data[f"{a}/actions"], data[f"{a}/rewards"]
+        next_obs, dones = data[f"{a}/next_obs"], data[f"{a}/dones"]
+        # rows whose next_obs isn't the following obs become explicit boundaries
+        breaks = np.ones(len(obs), dtype=bool)
+        breaks[:-1] = (next_obs[:-1] != obs[1:]).reshape(len(obs) - 1, -1).any(axis=1)
+        for i in range(len(obs)):
+            writer.append(a, obs[i], actions[i], rewards[i], next_obs[i], dones[i], boundary=breaks[i])
+    if writer is None:
+        writer = ReplayDatasetWriter(root, chunk_size=chunk_size)
+    writer.close()
+    return ReplayDataset(root)
+
+
+def merge_datasets(shard_roots: List[str], root: str, move: bool = True) -> ReplayDataset:
+    """
+    Concatenate shard datasets, in the given order, into one dataset at `root`.
+    Chunk files are moved (or copied with move=False), never rewritten. Every shard ends
+    on a boundary row, so chunks from different shards never bleed into each other.
+    """
+    os.makedirs(root, exist_ok=True)
+    chunk_rows: Dict[str, List[int]] = {}
+    meta = None
+    for shard in shard_roots:
+        with open(os.path.join(shard, INDEX_FILE)) as f:
+            index = json.load(f)
+        if not index["agents"]:
+            continue
+        if meta is None:
+            meta = index
+        elif (index["obs_shape"], index["obs_dtype"]) != (meta["obs_shape"], meta["obs_dtype"]):
+            raise ValueError(f"Shard {shard} has obs {index['obs_shape']}/{index['obs_dtype']}, "
+                             f"expected {meta['obs_shape']}/{meta['obs_dtype']}")
+        for agent, info in index["agents"].items():
+            rows = chunk_rows.setdefault(agent, [])
+            os.makedirs(os.path.join(root, agent), exist_ok=True)
+            for c, n in enumerate(info["chunk_rows"]):
+                for column in COLUMNS + BOUNDARY_COLUMNS:
+                    src, dst = _chunk_path(shard, agent, c, column), _chunk_path(root, agent, len(rows), column)
+                    if move:
+                        os.replace(src, dst)
+                    else:
+                        shutil.copyfile(src, dst)
+                rows.append(n)
+    meta = meta or {"obs_shape": [], "obs_dtype": np.dtype(np.uint8).str, "chunk_size": 0}
+    _write_index(root, meta["obs_shape"], meta["obs_dtype"], meta["chunk_size"], chunk_rows)
+    return ReplayDataset(root)
@@ -0,0 +1,58 @@
+# per-env NumPy random streams: seeded Generators, block-sampled ints and SeedSequence-spawned seeds
+
+import numpy as np
+
+
+def spawn_seeds(seed, n):
+    """`n` independent int seeds derived from `seed` (one SeedSequence.spawn child each)."""
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(n)]
+
+
+def substream(seed, key):
+    """
+    Generator for the `key`-th child stream of `seed` (the same stream as
+    SeedSequence(seed).spawn(key + 1)[key]), independent of default_rng(seed).
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(key,)))
+
+
+class BlockSampler:
+    """
+    Uniform ints in [0, high) drawn `block` at a time from one Generator and handed out
+    one by one as Python ints (or rows of `width` ints when `high` is a sequence, one
+    bound per column). The values only depend on the Generator's seed, not on when
+    they are consumed, so a seeded env replays bit-identically in any process.
+    """
+
+    def __init__(self, high, rng=None, block=256):
+        self.high = high
+        self.block = block
+        self.size = (block, len(high)) if np.ndim(high) else (block,)
+        self.reseed(rng if rng is not None else np.random.default_rng())
+
+    def reseed(self, rng):
+        """Draw from `rng` from now on, dropping the rest of the current block."""
+        self.rng = rng
+        self._buf = []
+        self._pos = 0
+
+    def draw(self):
+        if self._pos == len(self._buf):
+            self._buf = self.rng.integers(0, self.high, size=self.size).tolist()
+            self._pos = 0
+        value = self._buf[self._pos]
+        self._pos += 1
+        return value
+
+
+class SpawnSeedsMixin:
+    """
+    For VecEnvs: `seed(s)` gives env i the i-th SeedSequence.spawn child of `s`
+    instead of SB3's `s + i`, so parallel envs get independent, reproducible streams.
+    The VecEnv's action space is seeded with `s` too, so `action_space.sample()` replays.
+    """
+
+    def seed(self, seed=None):
+        self.action_space.seed(seed)
+        self._seeds = spawn_seeds(seed, self.num_envs)
+        return self._seeds
@@ -0,0 +1,130 @@
+# self-play opponent pool: frozen policy snapshots loaded lazily into a size-bounded LRU cache
+
+import glob
+import os
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+
+# key of the live learner in a pool sample (it acts with its current weights)
+SELF = "self"
+
+
+def policy_nbytes(policy):
+    return sum(p.numel() * p.element_size() for p in policy.parameters())
+
+
+class SnapshotPool:
+    """
+    Snapshot paths matching `pattern` in `directory`, sampled as opponents. A snapshot is
+    only loaded (on CPU, without its optimizer state) when first sampled, and loaded
+    policies are kept in an LRU cache whose parameter bytes stay under `cache_mb` (the most
+    recently used one always stays). Snapshots whose observation space doesn't match
+    `observation_space` are dropped from the pool on first load.
+
+    With probability `self_prob` (or when the pool is empty) a sample is the live learner
+    (`SELF`), once `learner` has been set.
+    """
+
+    def __init__(self, directory="checkpoints", pattern="selfplay_*.zip", cache_mb=256.0, self_prob=0.2,
+                 observation_space=None, algo_cls=PPO, seed=None):
+        self.directory = directory
+        self.pattern = pattern
+        self.cache_bytes = int(cache_mb * 2**20)
+        self.self_prob = self_prob
+        self.observation_space = observation_space
+        self.algo_cls = algo_cls
+        self.learner = None
+        self.paths = []
+        self._bad = set()
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._rng = np.random.default_rng(seed)
+        self.stats = dict(hits=0, loads=0, evictions=0)
+        self.refresh()
+
+    def refresh(self):
+        """Re-scan the directory for snapshots (oldest first)."""
+        paths = glob.glob(os.path.join(self.directory, self.pattern))
+        self.paths = sorted((p for p in paths if p not in self._bad), key=os.path.getmtime)
+        return len(self.paths)
+
+    def sample(self):
+        """A snapshot path or SELF (None while neither exists: the caller acts randomly)."""
+        if not self.paths or self._rng.random() < self.self_prob:
+            return SELF if self.learner is not None else None
+        return self.paths[self._rng.integers(len(self.paths))]
+
+    def get(self, key):
+        """The policy for a sampled key; None if it can't be used (caller resamples)."""
+        if key == SELF:
+            return self.learner
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._cache[key]
+        policy = self._load(key)
+        if policy is None:
+            return None
+        self._cache[key] = policy
+        self._cached_bytes += policy_nbytes(policy)
+        self.stats["loads"] += 1
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= policy_nbytes(evicted)
+            self.stats["evictions"] += 1
+        return policy
+
+    def _load(self, path):
+        try:
+            model = self.algo_cls.load(path, device="cpu")
+        except (OSError, ValueError, KeyError) as e:
+            # e.g. a checkpoint still being written
+            warnings.warn(f"Skipping snapshot {path}: {e}")
+            return None
+        policy = model.policy
+        if self.observation_space is not None and policy.observation_space.shape != self.observation_space.shape:
+            warnings.warn(f"Dropping snapshot {path}: observation shape {policy.observation_space.shape} "
+                          f"!= {self.observation_space.shape}")
+            self._bad.add(path)
+            self.paths.remove(path)
+            return None
+        policy.optimizer = None
+        policy.set_training_mode(False)
+        return policy
+
+    @property
+    def num_cached(self):
+        return len(self._cache)
+
+    @property
+    def cached_mb(self):
+        return self._cached_bytes / 2**20
+
+
+class SnapshotPoolCallback(BaseCallback):
+    """
+    Hands the learner's policy to the pool at the start of training, re-scans the
+    snapshot directory after every rollout (picking up checkpoints saved meanwhile)
+    and logs the pool / cache state under selfplay/.
+    """
+
+    def __init__(self, pool, verbose=0):
+        super().__init__(verbose)
+        self.pool = pool
+
+    def _on_training_start(self):
+        self.pool.learner = self.model.policy
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self):
+        self.logger.record("selfplay/pool_size", self.pool.refresh())
+        self.logger.record("selfplay/cached_snapshots", self.pool.num_cached)
+        self.logger.record("selfplay/cache_mb", self.pool.cached_mb)
+        for name, value in self.pool.stats.items():
+            self.logger.record(f"selfplay/cache_{name}", value)
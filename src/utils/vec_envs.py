@@ -0,0 +1,240 @@
+# vectorized env backends for the training scripts: dummy, subproc and shared-memory
+
+import multiprocessing as mp
+import os
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+from utils.seeding import SpawnSeedsMixin
+
+VEC_BACKENDS = ("dummy", "subproc", "shm")
+
+
+def add_vec_env_args(parser):
+    """Register --num-envs / --vec-backend / --seed on an argparse parser."""
+    parser.add_argument("--num-envs", type=int, default=1, help="number of parallel environments")
+    parser.add_argument("--vec-backend", choices=VEC_BACKENDS, default="dummy",
+                        help="dummy: in-process, subproc: one process per env, shm: shared-memory workers")
+    parser.add_argument("--seed", type=int, default=0, help="base seed; env i gets the i-th SeedSequence.spawn child seed")
+    return parser
+
+
+def make_vec_env(env_fn, num_envs=1, backend="dummy", seed=None):
+    """
+    Build a VecEnv of `num_envs` copies of `env_fn()`.
+    Env i resets with the i-th SeedSequence.spawn child of `seed` on its first reset, so every
+    worker is seeded deterministically with an independent stream.
+    """
+    env_fns = [env_fn for _ in range(num_envs)]
+    if backend == "dummy":
+        venv = SeededDummyVecEnv(env_fns)
+    elif backend == "subproc":
+        venv = SeededSubprocVecEnv(env_fns)
+    elif backend == "shm":
+        venv = ShmVecEnv(env_fns)
+    else:
+        raise ValueError(f"Unknown vec backend: {backend!r} (expected one of {VEC_BACKENDS})")
+    if seed is not None:
+        venv.seed(seed)
+    return venv
+
+
+class SeededDummyVecEnv(SpawnSeedsMixin, DummyVecEnv):
+    pass
+
+
+class SeededSubprocVecEnv(SpawnSeedsMixin, SubprocVecEnv):
+    pass
+
+
+# ----- Shared-memory backend -----
+
+def _shm_array(ctx, shape, dtype):
+    dtype = np.dtype(dtype)
+    raw = ctx.RawArray("b", max(1, int(np.prod(shape)) * dtype.itemsize))
+    return raw, shape, dtype
+
+
+def _as_numpy(spec):
+    raw, shape, dtype = spec
+    return np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+def _shm_worker(remote, parent_remote, env_fns_wrapper, start, buffers):
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    envs = [fn() for fn in env_fns_wrapper.var]
+    obs, terminal_obs, rewards, dones, actions = (_as_numpy(b) for b in buffers)
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                infos = []
+                for j, env in enumerate(envs):
+                    i = start + j
+                    observation, reward, terminated, truncated, info = env.step(actions[i])
+                    done = terminated or truncated
+                    info["TimeLimit.truncated"] = truncated and not terminated
+                    if done:
+                        # terminal obs goes through shared memory too; the parent attaches it to info
+                        terminal_obs[i] = observation
+                        observation, _ = env.reset()
+                    obs[i] = observation
+                    rewards[i] = reward
+                    dones[i] = done
+                    infos.append(info)
+                remote.send(infos)
+            elif cmd == "reset":
+                reset_infos = []
+                for j, env in enumerate(envs):
+                    seed, options = data[j]
+                    maybe_options = {"options": options} if options else {}
+                    observation, reset_info = env.reset(seed=seed, **maybe_options)
+                    obs[start + j] = observation
+                    reset_infos.append(reset_info)
+                remote.send(reset_infos)
+            elif cmd == "env_method":
+                name, local_ids, args, kwargs = data
+                remote.send([envs[j].get_wrapper_attr(name)(*args, **kwargs) for j in local_ids])
+            elif cmd == "get_attr":
+                name, local_ids = data
+                remote.send([envs[j].get_wrapper_attr(name) for j in local_ids])
+            elif cmd == "set_attr":
+                name, value, local_ids = data
+                for j in local_ids:
+                    setattr(envs[j], name, value)
+                remote.send(None)
+            elif cmd == "is_wrapped":
+                wrapper_class, local_ids = data
+                remote.send([is_wrapped(envs[j], wrapper_class) for j in local_ids])
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
+
+
+class ShmVecEnv(SpawnSeedsMixin, VecEnv):
+    """
+    Multiprocess VecEnv whose observations, rewards, dones and actions live in shared
+    memory, so stepping doesn't pickle arrays; only the small info dicts go through pipes.
+    Envs are split into contiguous slices over `n_workers` processes (default: one per core).
+    """
+
+    def __init__(self, env_fns, n_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        n_workers = min(n_envs, n_workers or os.cpu_count() or 1)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        act_dtype = np.int64 if action_space.shape == () else action_space.dtype
+        buffers = (
+            _shm_array(ctx, (n_envs, *observation_space.shape), observation_space.dtype),
+            _shm_array(ctx, (n_envs, *observation_space.shape), observation_space.dtype),
+            _shm_array(ctx, (n_envs,), np.float32),
+            _shm_array(ctx, (n_envs,), np.bool_),
+            _shm_array(ctx, (n_envs, *action_space.shape), act_dtype),
+        )
+        self._obs, self._terminal_obs, self._rewards, self._dones, self._actions = (_as_numpy(b) for b in buffers)
+
+        # worker w owns envs [bounds[w], bounds[w + 1])
+        self._bounds = np.linspace(0, n_envs, n_workers + 1).astype(int)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for w, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            start, stop = self._bounds[w], self._bounds[w + 1]
+            args = (work_remote, remote, CloudpickleWrapper(env_fns[start:stop]), start, buffers)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_shm_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def _slices(self):
+        return [range(self._bounds[w], self._bounds[w + 1]) for w in range(len(self.remotes))]
+
+    def _locate(self, indices):
+        """Group global env indices by worker as (remote, local ids)."""
+        per_worker = {}
+        for i in self._get_indices(indices):
+            w = int(np.searchsorted(self._bounds, i, side="right") - 1)
+            per_worker.setdefault(w, []).append(i - self._bounds[w])
+        return [(self.remotes[w], ids) for w, ids in per_worker.items()]
+
+    def step_async(self, actions):
+        self._actions[:] = np.asarray(actions).reshape(self._actions.shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [info for remote in self.remotes for info in remote.recv()]
+        self.waiting = False
+        for i in np.flatnonzero(self._dones):
+            infos[i]["terminal_observation"] = self._terminal_obs[i].copy()
+        return self._obs.copy(), self._rewards.copy(), self._dones.copy(), infos
+
+    def reset(self):
+        for remote, ids in zip(self.remotes, self._slices()):
+            remote.send(("reset", [(self._seeds[i], self._options[i]) for i in ids]))
+        self.reset_infos = [info for remote in self.remotes for info in remote.recv()]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs.copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        located = self._locate(indices)
+        for remote, ids in located:
+            remote.send(("get_attr", (attr_name, ids)))
+        return [value for remote, _ in located for value in remote.recv()]
+
+    def set_attr(self, attr_name, value, indices=None):
+        located = self._locate(indices)
+        for remote, ids in located:
+            remote.send(("set_attr", (attr_name, value, ids)))
+        for remote, _ in located:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        located = self._locate(indices)
+        for remote, ids in located:
+            remote.send(("env_method", (method_name, ids, method_args, method_kwargs)))
+        return [value for remote, _ in located for value in remote.recv()]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        located = self._locate(indices)
+        for remote, ids in located:
+            remote.send(("is_wrapped", (wrapper_class, ids)))
+        return [value for remote, _ in located for value in remote.recv()]
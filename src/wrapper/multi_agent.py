@@ -6,7 +6,12 @@ import numpy as np
 class MultiAgentWrapper(gym.Env):
     """
     Wraps a multi-agent environment (DeliveryFleetEnv) into a single Gym environment
-    for multi-agent PPO training. Observations are concatenated for all agents.
+    for multi-agent PPO training. The observation stacks all agents: (num_agents, *obs_shape).
+
+    The joint observation is the env's own `joint_observation()` view, so no per-step
+    copies are made here; it is valid until the next step (VecEnvs copy it into their buffers).
+    The last observation of an episode is returned as a copy: VecEnvs keep it as
+    infos["terminal_observation"] and then call reset(), which would overwrite the view.
     """
     metadata = {"render_modes": []}
 
@@ -16,14 +21,13 @@ class MultiAgentWrapper(gym.Env):
         self.base_env = base_env_cls(**env_kwargs)
         self.agents = self.base_env.agents
 
-        # ----- Observation space: concatenated for all agents -----
-        sample_obs = np.concatenate(
-            [np.array(self.base_env.reset()[agent], dtype=np.float32) for agent in self.agents]
-        )
+        # ----- Observation space: one row per agent -----
+        agent_space = self.base_env.observation_spaces[self.agents[0]]
+        n = len(self.agents)
         self.observation_space = gym.spaces.Box(
-            low=-np.inf * np.ones_like(sample_obs, dtype=np.float32),
-            high=np.inf * np.ones_like(sample_obs, dtype=np.float32),
-            dtype=np.float32,
+            low=np.broadcast_to(agent_space.low, (n, *agent_space.shape)),
+            high=np.broadcast_to(agent_space.high, (n, *agent_space.shape)),
+            dtype=agent_space.dtype,
         )
 
         # ----- Action space: MultiDiscrete across agents -----
@@ -34,22 +38,25 @@ class MultiAgentWrapper(gym.Env):
         self.action_space = gym.spaces.MultiDiscrete(max_actions)
 
     def reset(self, *, seed=None, options=None, **kwargs):
-        obs_dict = self.base_env.reset()
-        obs = np.concatenate([np.array(obs_dict[agent], dtype=np.float32) for agent in self.agents])
-        return obs, {}
+        if seed is not None:
+            super().reset(seed=seed)
+        _, infos = self.base_env.reset(seed=seed, options=options, **kwargs)
+        return self.base_env.joint_observation(), infos
 
     def step(self, action):
         """
         `action` is a list/array of actions for all agents in order of self.agents
         """
         actions = {agent: int(a) for agent, a in zip(self.agents, action)}
-        obs_dict, rewards_dict, dones_dict, infos_dict = self.base_env.step(actions)
+        _, rewards_dict, terminations, truncations, infos_dict = self.base_env.step(actions)
 
-        obs = np.concatenate([np.array(obs_dict[agent], dtype=np.float32) for agent in self.agents])
+        obs = self.base_env.joint_observation()
         reward = sum(rewards_dict.values())  # global reward
-        terminated = all(dones_dict.values())
-        truncated = False
+        terminated = all(terminations.values())
+        truncated = all(truncations.values())
         info = infos_dict
+        if terminated or truncated:
+            obs = obs.copy()
 
         return obs, reward, terminated, truncated, info
 
@@ -0,0 +1,156 @@
+# self-play VecEnv: the learner plays one agent per fleet, frozen snapshots play the others
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from env import DeliveryFleetEnv
+from utils.seeding import SpawnSeedsMixin
+
+
+class SelfPlayVecEnv(SpawnSeedsMixin, VecEnv):
+    """
+    Runs `num_envs` DeliveryFleetEnv instances; the learner acts for `control_agent` and
+    all other agents of an env are played by one opponent drawn from `pool`
+    (utils.snapshot_pool.SnapshotPool) when the env's episode starts. Envs without an
+    opponent (empty pool and no learner yet) act randomly for the others.
+
+    Before every step the background agents of all envs are grouped by opponent, so each
+    distinct snapshot runs a single batched forward pass over every env it plays in. An
+    env holds on to its opponent for the episode, so at most `num_envs` snapshots are in
+    memory beyond the pool's cache budget.
+
+    Observations are the control agent's flattened observation. Use an agent-centric
+    obs_mode ("egocentric" / "entities", or "grid" with a self channel, switched on by
+    default) so opponents act on their own agent's view.
+    """
+
+    render_mode = None
+
+    def __init__(self, num_envs, env_kwargs=None, pool=None, control_agent="agent_0", deterministic_opponents=False,
+                 seed=None):
+        env_kwargs = dict(env_kwargs or {})
+        if env_kwargs.get("obs_mode", "grid") == "grid":
+            env_kwargs.setdefault("self_channel", True)
+        self.envs = [DeliveryFleetEnv(**env_kwargs) for _ in range(num_envs)]
+        agents = self.envs[0].possible_agents
+        self.num_agents = len(agents)
+        self.control_idx = agents.index(control_agent)
+        self.other_idx = np.array([j for j in range(self.num_agents) if j != self.control_idx])
+        self.deterministic_opponents = deterministic_opponents
+
+        agent_space = self.envs[0].observation_spaces[control_agent]
+        observation_space = gym.spaces.Box(
+            low=agent_space.low.reshape(-1), high=agent_space.high.reshape(-1), dtype=agent_space.dtype
+        )
+        super().__init__(num_envs, observation_space, gym.spaces.Discrete(7))
+
+        self.pool = pool
+        if pool is not None and pool.observation_space is None:
+            pool.observation_space = observation_space
+        # per env: the sampled opponent key (snapshot path, "self" or None) and its policy
+        self.opponent_keys = [None] * num_envs
+        self._opponents = [None] * num_envs
+        self._obs = np.zeros((num_envs, observation_space.shape[0]), dtype=agent_space.dtype)
+        self._ep_t = np.zeros(num_envs, dtype=np.int64)
+        self._ep_return = np.zeros(num_envs, dtype=np.float64)
+        self._actions = None
+        self._np_random = np.random.default_rng(seed)
+        if seed is not None:
+            self.seed(seed)
+
+    def _load_obs(self, i):
+        self._obs[i] = self.envs[i].joint_observation()[self.control_idx].reshape(-1)
+
+    def _sample_opponent(self, i):
+        key, policy = None, None
+        if self.pool is not None:
+            # an opponent another env still plays is reused, even if the cache evicted it meanwhile
+            held = {k: p for k, p in zip(self.opponent_keys, self._opponents) if p is not None}
+            # unloadable snapshots are skipped by resampling a few times
+            for _ in range(3):
+                key = self.pool.sample()
+                policy = held.get(key) or (self.pool.get(key) if key is not None else None)
+                if policy is not None or key is None:
+                    break
+        self.opponent_keys[i] = key if policy is not None else None
+        self._opponents[i] = policy
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            env.reset(seed=self._seeds[i])
+            self._sample_opponent(i)
+            self._load_obs(i)
+        self._ep_t[:] = 0
+        self._ep_return[:] = 0.0
+        self._reset_seeds()
+        self._reset_options()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def _opponent_actions(self):
+        """int[B, A] joint actions: one forward pass per distinct opponent, random where there is none."""
+        B, others = self.num_envs, self.other_idx
+        joint = self._np_random.integers(0, 7, size=(B, self.num_agents))
+        groups = {}
+        for i, (key, policy) in enumerate(zip(self.opponent_keys, self._opponents)):
+            if policy is not None:
+                groups.setdefault(key, (policy, []))[1].append(i)
+        for policy, ids in groups.values():
+            obs = np.stack([self.envs[i].joint_observation()[others] for i in ids])
+            actions, _ = policy.predict(obs.reshape(len(ids) * len(others), -1),
+                                        deterministic=self.deterministic_opponents)
+            joint[np.ix_(ids, others)] = actions.reshape(len(ids), len(others))
+        joint[:, self.control_idx] = self._actions
+        return joint
+
+    def step_wait(self):
+        joint = self._opponent_actions()
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+        control = self.envs[0].possible_agents[self.control_idx]
+        for i, env in enumerate(self.envs):
+            _, rew, terminations, truncations, env_infos = env.step(dict(zip(env.agents, joint[i].tolist())))
+            rewards[i] = rew[control]
+            infos[i] = dict(env_infos[control])
+            self._ep_t[i] += 1
+            self._ep_return[i] += rewards[i]
+            self._load_obs(i)
+
+            if all(terminations[a] or truncations[a] for a in env.agents):
+                dones[i] = True
+                infos[i]["terminal_observation"] = self._obs[i].copy()
+                infos[i]["TimeLimit.truncated"] = not any(terminations.values())
+                infos[i]["episode"] = {"r": float(self._ep_return[i]), "l": int(self._ep_t[i])}
+                infos[i]["opponent"] = self.opponent_keys[i]
+                env.reset()
+                self._sample_opponent(i)
+                self._load_obs(i)
+                self._ep_t[i] = 0
+                self._ep_return[i] = 0.0
+
+        return self._obs.copy(), rewards, dones, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+    # ----- VecEnv attribute plumbing -----
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "render_mode":
+            return [None for _ in self._get_indices(indices)]
+        return [getattr(self.envs[i], attr_name) for i in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for i in self._get_indices(indices):
+            setattr(self.envs[i], attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self.envs[i], method_name)(*method_args, **method_kwargs) for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
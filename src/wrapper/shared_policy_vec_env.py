@@ -0,0 +1,134 @@
+# parameter-sharing VecEnv: every agent of every DeliveryFleetEnv is one row of the batch
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from env import DeliveryFleetEnv
+from utils.seeding import SpawnSeedsMixin
+
+
+class SharedPolicyVecEnv(SpawnSeedsMixin, VecEnv):
+    """
+    Runs `num_envs` DeliveryFleetEnv instances and exposes each of their agents as one
+    VecEnv row, so num_envs * num_agents agents are acted for by one shared policy in a
+    single forward pass. Rows are ordered env-major (env 0's agents first, then env 1's, ...).
+
+    Each row observes its own agent's (flattened) observation and receives its own reward,
+    so observation and action spaces don't depend on `num_agents` and a policy trained here
+    runs unchanged on fleets of other sizes. Use an agent-centric obs_mode: "egocentric" or
+    "entities", or "grid" with a self channel (switched on by default, without it all
+    agents of an env would see the same input).
+    An env's rows all end together when the env truncates; the env then auto-resets.
+
+    `env_kwargs` may also be a list with one kwargs dict per env, to mix env settings
+    (e.g. several curriculum stages) in one batch; their observation shapes must match.
+    """
+
+    render_mode = None
+
+    def __init__(self, num_envs, env_kwargs=None, seed=None):
+        per_env = env_kwargs if isinstance(env_kwargs, (list, tuple)) else [env_kwargs] * num_envs
+        if len(per_env) != num_envs:
+            raise ValueError(f"Got {len(per_env)} env_kwargs for {num_envs} envs")
+        self.envs = []
+        for kwargs in per_env:
+            kwargs = dict(kwargs or {})
+            if kwargs.get("obs_mode", "grid") == "grid":
+                kwargs.setdefault("self_channel", True)
+            self.envs.append(DeliveryFleetEnv(**kwargs))
+        self.num_fleets = num_envs
+        # rows of env i: [row_start[i], row_start[i + 1])
+        self.agents_per_env = np.array([len(env.possible_agents) for env in self.envs])
+        self.row_start = np.concatenate([[0], np.cumsum(self.agents_per_env)])
+
+        spaces = [env.observation_spaces[env.possible_agents[0]] for env in self.envs]
+        if len({(space.shape, space.dtype) for space in spaces}) != 1:
+            raise ValueError("All envs must share one per-agent observation shape/dtype (use egocentric/entities obs)")
+        agent_space = spaces[0]
+        observation_space = gym.spaces.Box(
+            low=agent_space.low.reshape(-1), high=agent_space.high.reshape(-1), dtype=agent_space.dtype
+        )
+        super().__init__(int(self.row_start[-1]), observation_space, gym.spaces.Discrete(7))
+
+        self._obs = np.zeros((self.num_envs, observation_space.shape[0]), dtype=agent_space.dtype)
+        self._ep_t = np.zeros(num_envs, dtype=np.int64)
+        self._ep_return = np.zeros(self.num_envs, dtype=np.float64)
+        self._actions = None
+        if seed is not None:
+            self.seed(seed)
+
+    def _rows(self, i):
+        return slice(self.row_start[i], self.row_start[i + 1])
+
+    def _load_obs(self, i):
+        self._obs[self._rows(i)] = self.envs[i].joint_observation().reshape(self.agents_per_env[i], -1)
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            env.reset(seed=self._seeds[self.row_start[i]])
+            self._load_obs(i)
+        self._ep_t[:] = 0
+        self._ep_return[:] = 0.0
+        self._reset_seeds()
+        self._reset_options()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+        for i, env in enumerate(self.envs):
+            agents, rows, start = env.agents, self._rows(i), self.row_start[i]
+            _, rew, terminations, truncations, env_infos = env.step(
+                {agent: int(a) for agent, a in zip(agents, self._actions[rows])}
+            )
+            rewards[rows] = [rew[agent] for agent in agents]
+            for j, agent in enumerate(agents):
+                infos[start + j] = dict(env_infos[agent])
+            self._ep_t[i] += 1
+            self._ep_return[rows] += rewards[rows]
+            self._load_obs(i)
+
+            if all(terminations[a] or truncations[a] for a in agents):
+                dones[rows] = True
+                truncated = not any(terminations.values())
+                for j in range(len(agents)):
+                    info = infos[start + j]
+                    info["terminal_observation"] = self._obs[start + j].copy()
+                    info["TimeLimit.truncated"] = truncated
+                    info["episode"] = {"r": float(self._ep_return[start + j]), "l": int(self._ep_t[i])}
+                env.reset()
+                self._load_obs(i)
+                self._ep_t[i] = 0
+                self._ep_return[rows] = 0.0
+
+        return self._obs.copy(), rewards, dones, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+    # ----- VecEnv attribute plumbing (rows of one env share its attributes) -----
+    def _row_envs(self, indices):
+        env_of_row = np.searchsorted(self.row_start, list(self._get_indices(indices)), side="right") - 1
+        return [self.envs[i] for i in env_of_row]
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "render_mode":
+            return [None for _ in self._get_indices(indices)]
+        return [getattr(env, attr_name) for env in self._row_envs(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for env in self._row_envs(indices):
+            setattr(env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(env, method_name)(*method_args, **method_kwargs) for env in self._row_envs(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
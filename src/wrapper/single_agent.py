@@ -1,18 +1,32 @@
 # single-agent wrapper for DeliveryFleetEnv to be used with single-agent PPO
 
+from concurrent.futures import ThreadPoolExecutor
+
 import gymnasium as gym
 import numpy as np
 
+from policies.background import make_others_policy
+from utils.profiling import timed
+from utils.seeding import BlockSampler, substream
+
 class SingleAgentWrapper(gym.Env):
     """
     Wraps a multi-agent env (DeliveryFleetEnv) into a single-agent Gym environment.
-    Only the `control_agent` is controlled; other agents act randomly.
+    Only the `control_agent` is controlled; other agents act randomly, from a Generator of
+    their own (a SeedSequence child of the reset seed) drawn a block of steps at a time.
     Compatible with Stable-Baselines3 (PPO).
+
+    `others_policy` replaces the random agents with a background policy evaluated once per
+    step for the whole fleet: "greedy", "ppo:<zip>", a CoordinatedGreedy, an SB3 model or a
+    callable(env) (see policies.background.make_others_policy). With `async_others` the
+    next step's background actions are computed on a thread as soon as an observation is
+    returned, overlapping with the learner's own forward pass.
     """
 
     metadata = {"render_modes": []}
 
-    def __init__(self, base_env_cls, env_kwargs=None, control_agent="agent_0", max_episode_steps=100):
+    def __init__(self, base_env_cls, env_kwargs=None, control_agent="agent_0", max_episode_steps=100,
+                 others_policy=None, async_others=False):
         super().__init__()
         env_kwargs = env_kwargs or {}
         self.base_env = base_env_cls(**env_kwargs)
@@ -22,12 +36,15 @@ class SingleAgentWrapper(gym.Env):
 
         # ----- Observation space (flatten to 1D vector) -----
         obs, _ = self.base_env.reset()
-        sample_obs = np.array(obs[self.control_agent], dtype=np.float32).flatten()
+        base_space = getattr(self.base_env, "observation_spaces", {}).get(self.control_agent, None)
+        # keep the env's observation dtype (float32, or compact uint8 / bit-packed bytes)
+        self._obs_dtype = base_space.dtype if base_space is not None else np.float32
+        sample_obs = np.array(obs[self.control_agent], dtype=self._obs_dtype).flatten()
         self.observation_space = gym.spaces.Box(
-            low=0.0,
-            high=1.0,
+            low=base_space.low.flatten() if base_space is not None else 0.0,
+            high=base_space.high.flatten() if base_space is not None else 1.0,
             shape=sample_obs.shape,
-            dtype=np.float32,
+            dtype=self._obs_dtype,
         )
 
         # ----- Action space -----
@@ -42,42 +59,76 @@ class SingleAgentWrapper(gym.Env):
             except Exception:
                 self.action_space = gym.spaces.Discrete(5)
 
+        # ----- Random opponents: one row of actions for every agent per step -----
+        highs = []
+        for agent in self.base_env.agents:
+            space = getattr(self.base_env, "action_spaces", {}).get(agent, None)
+            highs.append(space if isinstance(space, int) else space.n if space is not None else 5)
+        self._control_idx = self.base_env.agents.index(self.control_agent)
+        self._opponents = BlockSampler(highs)
+        self._others_policy = make_others_policy(others_policy, self.base_env)
+        self._pool = ThreadPoolExecutor(1) if async_others and self._others_policy is not None else None
+        self._pending = None
+
     def reset(self, *, seed=None, options=None, **kwargs):
         self._t = 0
+        if seed is not None:
+            # seed the random opponents too, so a seeded worker replays the same episode
+            super().reset(seed=seed)
+            self._opponents.reseed(substream(seed, 0))
+        self._drain()
         obs, info = self.base_env.reset(seed=seed, options=options, **kwargs)
-        obs = np.array(obs[self.control_agent], dtype=np.float32).flatten()
-        return obs, info.get(self.control_agent, {})
+        self._prefetch_others()
+        return self._convert(obs), info.get(self.control_agent, {})
 
     def step(self, action):
         self._t += 1
 
-        # Build full action dict (random for other agents)
-        actions = {}
-        for agent in self.base_env.agents:
-            if agent == self.control_agent:
-                actions[agent] = int(action)
-            else:
-                space = getattr(self.base_env, "action_spaces", {}).get(agent, None)
-                if isinstance(space, int):
-                    actions[agent] = np.random.randint(0, space)
-                elif space is not None:
-                    actions[agent] = space.sample()
-                else:
-                    actions[agent] = np.random.randint(0, 5)
-
+        actions = self._joint_action(action)
         obs, rewards, terminateds, truncateds, infos = self.base_env.step(actions)
+        self._prefetch_others()
 
         terminated = terminateds.get(self.control_agent, False)
         truncated = truncateds.get(self.control_agent, False) or (self._t >= self.max_episode_steps)
 
-        obs = np.array(obs[self.control_agent], dtype=np.float32).flatten()
+        obs = self._convert(obs)
         reward = float(rewards[self.control_agent])
         info = infos.get(self.control_agent, {})
 
         return obs, reward, terminated, truncated, info
 
+    @timed("wrapper.others")
+    def _joint_action(self, action):
+        # Build full action dict (background policy or random for other agents)
+        if self._pending is not None:
+            row = list(self._pending.result())
+            self._pending = None
+        elif self._others_policy is not None:
+            row = list(self._others_policy(self.base_env))
+        else:
+            row = self._opponents.draw()
+        row[self._control_idx] = int(action)
+        return dict(zip(self.base_env.agents, row))
+
+    def _prefetch_others(self):
+        # the env is only read by the thread until the next step / reset collects the result
+        if self._pool is not None:
+            self._pending = self._pool.submit(self._others_policy, self.base_env)
+
+    def _drain(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    @timed("wrapper.convert")
+    def _convert(self, obs):
+        return np.array(obs[self.control_agent], dtype=self._obs_dtype).flatten()
+
     def render(self):
         return self.base_env.render()
 
     def close(self):
+        self._drain()
+        if self._pool is not None:
+            self._pool.shutdown()
         self.base_env.close()
@@ -0,0 +1,101 @@
+# SB3 VecEnv over BatchedDeliveryCore: N single-agent envs stepped in one NumPy call
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from batched_env import BatchedDeliveryCore
+from utils.obs_encoding import obs_space, pack_obs
+from utils.seeding import SpawnSeedsMixin
+
+
+class DeliveryFleetVecEnv(SpawnSeedsMixin, VecEnv):
+    """
+    Vectorized counterpart of `DummyVecEnv([SingleAgentWrapper(...)] * num_envs)`.
+    Only `control_agent` is controlled; other agents act randomly.
+    Observations are the flattened (C, grid_size, grid_size) grid, like SingleAgentWrapper,
+    in the encoding given by `obs_dtype` in env_kwargs (float32, uint8 or bit-packed bytes).
+    """
+
+    render_mode = None
+
+    def __init__(self, num_envs, env_kwargs=None, control_agent="agent_0", max_episode_steps=100, seed=None):
+        env_kwargs = dict(env_kwargs or {})
+        self.obs_dtype = env_kwargs.pop("obs_dtype", "float32")
+        self.core = BatchedDeliveryCore(num_envs, **env_kwargs)
+        self.control_idx = int(control_agent.split("_")[-1])
+        self.max_episode_steps = max_episode_steps
+
+        G = self.core.grid_size
+        grid_shape = (self.core.num_channels, G, G)
+        observation_space = obs_space(grid_shape, self.obs_dtype)
+        if self.obs_dtype != "packed":
+            observation_space = obs_space((int(np.prod(grid_shape)),), self.obs_dtype)
+        action_space = gym.spaces.Discrete(7)
+        super().__init__(num_envs, observation_space, action_space)
+
+        self._obs = np.zeros((num_envs, *grid_shape), dtype=np.float32 if self.obs_dtype == "float32" else np.uint8)
+        self._ep_t = np.zeros(num_envs, dtype=np.int64)
+        self._ep_return = np.zeros(num_envs, dtype=np.float64)
+        self._actions = None
+        self._np_random = np.random.default_rng(seed)
+        if seed is not None:
+            self.seed(seed)
+
+    def reset(self):
+        seeds = [s for s in self._seeds]
+        self.core.reset(seeds=seeds)
+        self._ep_t[:] = 0
+        self._ep_return[:] = 0.0
+        self._reset_seeds()
+        self._reset_options()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._flat_obs().copy()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        core = self.core
+        joint = self._np_random.integers(0, 7, size=(self.num_envs, core.num_agents))
+        joint[:, self.control_idx] = self._actions
+
+        rewards, delivered, truncated = core.step(joint)
+        reward = rewards[:, self.control_idx].copy()
+        self._ep_t += 1
+        self._ep_return += reward
+        truncated = truncated | (self._ep_t >= self.max_episode_steps)
+
+        obs = self._flat_obs().copy()
+        infos = [{"delivered": bool(d)} for d in delivered[:, self.control_idx]]
+        done_ids = np.flatnonzero(truncated)
+        for b in done_ids:
+            infos[b]["terminal_observation"] = obs[b].copy()
+            infos[b]["TimeLimit.truncated"] = True
+            infos[b]["episode"] = {"r": float(self._ep_return[b]), "l": int(self._ep_t[b])}
+        if len(done_ids):
+            core.reset(env_ids=done_ids)
+            self._ep_t[done_ids] = 0
+            self._ep_return[done_ids] = 0.0
+            obs[done_ids] = self._flat_obs()[done_ids]
+        return obs, reward, truncated.copy(), infos
+
+    def _flat_obs(self):
+        obs = self.core.observe(out=self._obs)
+        return pack_obs(obs) if self.obs_dtype == "packed" else obs.reshape(self.num_envs, -1)
+
+    def close(self):
+        pass
+
+    # ----- VecEnv attribute plumbing (single shared core, so attributes are batch-wide) -----
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]